@@ -0,0 +1,70 @@
+from app import db
+from models import Booking
+from sqlalchemy import func
+from datetime import date, timedelta
+import calendar
+
+# Longest range a single calendar request may ask for
+MAX_RANGE_DAYS = 366
+
+
+def is_active():
+    """Matches bookings that hold their date, like ACTIVE_BOOKING_CONDITION."""
+    return func.coalesce(Booking.booking_status, 'pending') != 'cancelled'
+
+
+def active_bookings():
+    return Booking.query.filter(is_active())
+
+
+def booked_dates(facility_ids, start_date, end_date):
+    """Return ``{facility_id: set(dates)}`` of booked days in the range.
+
+    One range query over the (facility_id, booking_date) index, however many
+    facilities and days are asked for.
+    """
+    facility_ids = [int(f) for f in facility_ids]
+    booked = {facility_id: set() for facility_id in facility_ids}
+    if not facility_ids:
+        return booked
+
+    rows = db.session.query(Booking.facility_id, Booking.booking_date).filter(
+        Booking.facility_id.in_(facility_ids),
+        Booking.booking_date.between(start_date, end_date),
+        is_active()
+    ).all()
+
+    for facility_id, booking_date in rows:
+        booked[facility_id].add(booking_date)
+    return booked
+
+
+def facility_availability(facility_ids, start_date, end_date):
+    """Availability for each facility over ``start_date``..``end_date``.
+
+    Each facility gets a bitmap string with one character per day ('1' for
+    booked, '0' for free) plus the list of free dates.
+    """
+    booked = booked_dates(facility_ids, start_date, end_date)
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    availability = {}
+    for facility_id, taken in booked.items():
+        availability[facility_id] = {
+            'bitmap': ''.join('1' if day in taken else '0' for day in days),
+            'free_dates': [day.isoformat() for day in days if day not in taken],
+        }
+    return availability
+
+
+def find_booking(facility_id, booking_date):
+    """The active booking holding a facility on a date, if any."""
+    return active_bookings().filter(
+        Booking.facility_id == facility_id,
+        Booking.booking_date == booking_date
+    ).first()
+
+
+def month_range(year, month):
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, last_day)
@@ -0,0 +1,198 @@
+"""Route-level benchmarks at several data scales.
+
+    python bench.py --scale 1 --scale 10 --scale 50 --output bench.json
+
+Each scale runs in a fresh process against a new SQLite database filled
+by ``flask seed``; set BENCH_POSTGRES_URL (or --postgres-url) to repeat
+the runs on PostgreSQL. That database is wiped before every scale, so
+point it at a scratch database.
+"""
+from datetime import date, datetime, timedelta
+import click
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# (name, path); paths are formatted with the sample values from _sample_args()
+BENCH_ROUTES = [
+    ('dashboard', '/dashboard'),
+    ('bookings', '/bookings'),
+    ('customers', '/customers'),
+    ('revenue', '/revenue'),
+    ('expenses', '/expenses'),
+    ('income_expense_report', '/reports/income-expense?start_date={year_ago}&end_date={today}'),
+    ('check_availability', '/api/check-availability?facility_id={facility_id}&date={next_month}'),
+    ('facility_events', '/api/facility-events?facility_id={facility_id}'),
+]
+
+# The layout template isn't part of the repository; a bare one keeps the
+# page routes renderable when it is missing
+FALLBACK_BASE_TEMPLATE = '<html><body>{% block content %}{% endblock %}</body></html>'
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _sample_args():
+    today = date.today()
+    return {
+        'today': today.isoformat(),
+        'year_ago': (today - timedelta(days=365)).isoformat(),
+        'next_month': (today + timedelta(days=30)).isoformat(),
+        'facility_id': 1,
+    }
+
+
+def run_scale(scale, requests, warmup, cache=False):
+    """Seed the database in DATABASE_URL and time every route; runs in the worker."""
+    from app import app, db
+    from models import User
+    from migrations import apply_migrations
+    from seed import seed
+    from jinja2 import ChoiceLoader, DictLoader, TemplateNotFound
+    from sqlalchemy import event
+
+    app.config['TESTING'] = True
+    # Repeat requests would otherwise measure the response cache
+    app.config['RESPONSE_CACHE_ENABLED'] = cache
+    try:
+        app.jinja_env.get_template('base.html')
+    except TemplateNotFound:
+        app.jinja_loader = ChoiceLoader([app.jinja_loader,
+                                         DictLoader({'base.html': FALLBACK_BASE_TEMPLATE})])
+
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            db.drop_all()
+        apply_migrations()
+        started = time.perf_counter()
+        counts = seed(scale)
+        seed_seconds = time.perf_counter() - started
+        admin = User.query.filter_by(username='admin').first()
+        dialect = db.engine.dialect.name
+        queries = [0]
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *args: queries.__setitem__(0, queries[0] + 1))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=admin.id, username=admin.username, role=admin.role,
+                       full_name=admin.full_name)
+
+    args = _sample_args()
+    routes = []
+    for name, path in BENCH_ROUTES:
+        path = path.format(**args)
+        for _ in range(warmup):
+            client.get(path)
+
+        latencies, statuses = [], set()
+        queries[0] = 0
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - started)
+            statuses.add(response.status_code)
+        query_count = queries[0] / requests
+
+        # Measured in a separate pass, since tracing slows every allocation
+        tracemalloc.start()
+        for _ in range(min(requests, 5)):
+            client.get(path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        routes.append({
+            'route': name,
+            'path': path,
+            'status': sorted(statuses),
+            'requests': requests,
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+            'queries': round(query_count, 2),
+            'peak_memory_kb': round(peak / 1024, 1),
+        })
+
+    return {'scale': scale, 'database': dialect, 'cache': cache, 'rows': counts,
+            'seed_seconds': round(seed_seconds, 2), 'routes': routes}
+
+
+def _run_worker(database_url, scale, requests, warmup, cache):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--scale', str(scale),
+         '--requests', str(requests), '--warmup', str(warmup)] + (['--cache'] if cache else []),
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        raise click.ClickException(f'scale {scale} failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _print_result(result):
+    print(f"\n{result['database']} scale {result['scale']}: "
+          + ', '.join(f'{count} {table}' for table, count in result['rows'].items()))
+    print(f"  {'route':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'peak KB':>10}")
+    for route in result['routes']:
+        flag = '' if route['status'] == [200] else f"  status {route['status']}"
+        print(f"  {route['route']:<24}{route['p50_ms']:>9}{route['p95_ms']:>9}{route['p99_ms']:>9}"
+              f"{route['queries']:>9}{route['peak_memory_kb']:>10}{flag}")
+
+
+@click.command()
+@click.option('--scale', 'scales', multiple=True, type=click.IntRange(min=1),
+              help='Data scales to run (repeatable; default 1, 5 and 20).')
+@click.option('--requests', default=50, show_default=True, help='Timed requests per route.')
+@click.option('--warmup', default=3, show_default=True, help='Untimed requests per route first.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results as JSON here.')
+@click.option('--postgres-url', envvar='BENCH_POSTGRES_URL',
+              help='Scratch PostgreSQL database to benchmark as well; it is wiped.')
+@click.option('--cache', is_flag=True, help='Leave the response cache on (measures cache hits).')
+@click.option('--worker', is_flag=True, hidden=True)
+def main(scales, requests, warmup, output, postgres_url, cache, worker):
+    if worker:
+        print(json.dumps(run_scale(scales[0], requests, warmup, cache)))
+        return
+
+    scales = scales or (1, 5, 20)
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            results.append(_run_worker('sqlite:///' + os.path.join(tmp, 'bench.db'),
+                                       scale, requests, warmup, cache))
+        _print_result(results[-1])
+        if postgres_url:
+            results.append(_run_worker(postgres_url, scale, requests, warmup, cache))
+            _print_result(results[-1])
+
+    if output:
+        report = {
+            'started': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'commit': _git_commit(),
+            'results': results,
+        }
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {output}')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == '__main__':
+    main()
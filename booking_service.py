@@ -0,0 +1,212 @@
+from app import db
+from models import Booking, Customer, Revenue, Facility
+from event_index import is_event_allowed
+from ledger import record_payment
+from availability import booked_dates
+import dashboard_stats
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from datetime import date, timedelta
+
+# Most dates one recurring booking request may create
+MAX_SERIES_DATES = 366
+
+# rule -> weekdays (0 = Monday) it books when none are given
+SERIES_RULES = {
+    'weekly': None,  # the start date's weekday
+    'weekdays': (0, 1, 2, 3, 4),
+    'dates': None,  # an explicit list
+}
+
+
+class BookingError(Exception):
+    """A booking request that can't be accepted; the message is user-facing."""
+
+
+class BookingConflict(BookingError):
+    def __init__(self, message='This facility is already booked for the selected date'):
+        super().__init__(message)
+
+
+class BookingNotAllowed(BookingError):
+    pass
+
+
+class SeriesConflict(BookingConflict):
+    """Some dates of an all-or-nothing series are taken; none were booked."""
+
+    def __init__(self, dates):
+        self.dates = sorted(dates)
+        super().__init__(f'{len(self.dates)} of the requested dates are already booked')
+
+
+def is_date_conflict(error):
+    """Whether an IntegrityError came from the one-active-booking-per-day index."""
+    message = str(getattr(error, 'orig', error))
+    return ('uq_bookings_facility_date_active' in message
+            or ('UNIQUE' in message and 'bookings.facility_id' in message))
+
+
+def create_booking(customer_id, facility_id, event_id, booking_date, created_by,
+                   advance_amount=0, currency_type='USD', notes=''):
+    """Create a booking and its advance payment as one unit of work.
+
+    No availability pre-check: the unique index on (facility_id,
+    booking_date) for active bookings decides between concurrent clerks,
+    and the loser gets a BookingConflict. The booking and its Revenue row
+    commit together or not at all.
+    """
+    if not is_event_allowed(event_id, facility_id):
+        raise BookingNotAllowed('The selected event cannot be held in this facility')
+
+    facility = db.session.get(Facility, int(facility_id))
+    if facility is None:
+        raise BookingNotAllowed('Unknown facility')
+    if db.session.get(Customer, int(customer_id)) is None:
+        raise BookingNotAllowed('Unknown customer')
+
+    booking = Booking(
+        customer_id=customer_id,
+        facility_id=facility.id,
+        event_id=event_id,
+        booking_date=booking_date,
+        total_fee_usd=facility.usd_fee,
+        advance_paid_usd=0,
+        advance_paid_lrd=0,
+        booking_status='confirmed' if advance_amount > 0 else 'pending',
+        notes=notes,
+        created_by=created_by
+    )
+
+    try:
+        db.session.add(booking)
+        db.session.flush()
+
+        # Create revenue entry if advance payment made
+        if advance_amount > 0:
+            revenue = Revenue(
+                booking_id=booking.id,
+                payment_date=date.today(),
+                currency_type=currency_type,
+                recorded_by=created_by
+            )
+            if currency_type == 'USD':
+                revenue.amount_usd = advance_amount
+            else:
+                revenue.amount_lrd = advance_amount
+            record_payment(revenue)
+
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_date_conflict(e):
+            raise BookingConflict()
+        raise
+
+    return booking
+
+
+def expand_series(rule, start_date=None, end_date=None, weekdays=None, interval=1, dates=None):
+    """The sorted, distinct dates of a recurring booking.
+
+    ``weekly`` repeats on ``weekdays`` (default: the start date's) every
+    ``interval`` weeks from ``start_date`` to ``end_date``; ``weekdays``
+    books Monday to Friday; ``dates`` takes the explicit list ``dates``.
+    """
+    if rule not in SERIES_RULES:
+        raise BookingError(f"Unknown repeat rule '{rule}'")
+    if rule == 'dates':
+        series = set(dates or [])
+    else:
+        if start_date is None or end_date is None or end_date < start_date:
+            raise BookingError('A repeating booking needs a start date on or before its end date')
+        if interval < 1:
+            raise BookingError('The repeat interval must be at least one week')
+        weekdays = set(weekdays or SERIES_RULES[rule] or [start_date.weekday()])
+        if not weekdays <= set(range(7)):
+            raise BookingError('Weekdays run from 0 (Monday) to 6 (Sunday)')
+        # Even one date a week can't fill more than this without going over
+        # the cap, and it bounds the loop below
+        if (end_date - start_date).days >= MAX_SERIES_DATES * 7 * interval:
+            raise BookingError(f'A series can book at most {MAX_SERIES_DATES} dates')
+        series = set()
+        week = start_date - timedelta(days=start_date.weekday())
+        while week <= end_date:
+            for weekday in weekdays:
+                day = week + timedelta(days=weekday)
+                if start_date <= day <= end_date:
+                    series.add(day)
+            week += timedelta(weeks=interval)
+
+    if not series:
+        raise BookingError('The repeat rule matches no dates')
+    if len(series) > MAX_SERIES_DATES:
+        raise BookingError(f'A series can book at most {MAX_SERIES_DATES} dates')
+    return sorted(series)
+
+
+def series_conflicts(facility_id, dates):
+    """The dates in ``dates`` on which the facility is already booked, in one range query."""
+    return sorted(booked_dates([facility_id], min(dates), max(dates))[int(facility_id)] & set(dates))
+
+
+def create_series(customer_id, facility_id, event_id, dates, created_by,
+                  all_or_nothing=False, notes=''):
+    """Book a facility on every date in ``dates`` as one transaction.
+
+    Returns ``(created, conflicts)``: ``(booking_id, date)`` of each new
+    booking and the dates that were already taken. Taken dates are found
+    with a single query and skipped, or with ``all_or_nothing`` the whole
+    series is refused with a SeriesConflict. The free dates go in as one
+    multi-row INSERT; if a concurrent booking takes one of them in between,
+    the unique index rejects the batch and the check runs once more.
+    """
+    if not is_event_allowed(event_id, facility_id):
+        raise BookingNotAllowed('The selected event cannot be held in this facility')
+
+    facility = db.session.get(Facility, int(facility_id))
+    if facility is None:
+        raise BookingNotAllowed('Unknown facility')
+    # Otherwise only the foreign key would catch it, as a 500 on PostgreSQL
+    if db.session.get(Customer, int(customer_id)) is None:
+        raise BookingNotAllowed('Unknown customer')
+
+    table = Booking.__table__
+    for attempt in range(2):
+        conflicts = series_conflicts(facility.id, dates)
+        if conflicts and all_or_nothing:
+            raise SeriesConflict(conflicts)
+        taken = set(conflicts)
+        rows = [{
+            'customer_id': customer_id,
+            'facility_id': facility.id,
+            'event_id': event_id,
+            'booking_date': booking_date,
+            'total_fee_usd': facility.usd_fee,
+            'advance_paid_usd': 0,
+            'advance_paid_lrd': 0,
+            'payment_status': 'pending',
+            'booking_status': 'pending',
+            'notes': notes,
+            'created_by': created_by,
+        } for booking_date in dates if booking_date not in taken]
+        if not rows:
+            return [], conflicts
+
+        try:
+            # Unordered RETURNING lets SQLite batch the rows too; each id
+            # comes back with its date
+            created = db.session.execute(
+                insert(table).returning(table.c.id, table.c.booking_date), rows).all()
+            # Core inserts skip the flush listener, so keep the dashboard in step here
+            dashboard_stats.apply_deltas(db.session.connection(),
+                                         {'total_bookings': len(rows), 'pending_bookings': len(rows)})
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_date_conflict(e):
+                raise
+            if attempt:
+                raise BookingConflict()
+            continue
+        return sorted((tuple(row) for row in created), key=lambda row: row[1]), conflicts
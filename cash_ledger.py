@@ -0,0 +1,216 @@
+from app import app, db
+from models import CashManagement, CashBalanceCheckpoint, Revenue, Expense
+from sqlalchemy import event, func, insert, delete
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+import click
+
+LOCATIONS = ('vault', 'bank')
+CURRENCIES = ('USD', 'LRD')
+TRANSACTION_TYPES = ('deposit', 'withdrawal', 'transfer')
+
+# Payments made this way go through the vault; everything else the bank
+CASH_PAYMENT_METHODS = ('cash',)
+
+
+class CashLedgerError(ValueError):
+    pass
+
+
+def location_for(payment_method):
+    return 'vault' if (payment_method or 'cash') in CASH_PAYMENT_METHODS else 'bank'
+
+
+def _amount_column(currency_type):
+    return CashManagement.amount_usd if currency_type == 'USD' else CashManagement.amount_lrd
+
+
+def movements(currency_type, after_date=None, through_date=None):
+    """Net change per location over (after_date, through_date].
+
+    Summed in SQL per transaction type and location pair, so it reads a
+    handful of groups however many transactions the window holds.
+    """
+    amount = _amount_column(currency_type)
+    query = db.session.query(
+        CashManagement.transaction_type, CashManagement.location,
+        CashManagement.from_location, CashManagement.to_location,
+        func.coalesce(func.sum(amount), 0)
+    ).filter(CashManagement.currency_type == currency_type)
+    if after_date is not None:
+        query = query.filter(CashManagement.transaction_date > after_date)
+    if through_date is not None:
+        query = query.filter(CashManagement.transaction_date <= through_date)
+    groups = query.group_by(
+        CashManagement.transaction_type, CashManagement.location,
+        CashManagement.from_location, CashManagement.to_location
+    ).all()
+
+    change = defaultdict(Decimal)
+    for transaction_type, location, from_location, to_location, total in groups:
+        total = Decimal(str(total))
+        if transaction_type == 'deposit':
+            change[location] += total
+        elif transaction_type == 'withdrawal':
+            change[location] -= total
+        elif transaction_type == 'transfer':
+            change[from_location or location] -= total
+            change[to_location] += total
+    return change
+
+
+def _latest_checkpoint(location, currency_type, as_of=None):
+    query = CashBalanceCheckpoint.query.filter_by(location=location, currency_type=currency_type)
+    if as_of is not None:
+        query = query.filter(CashBalanceCheckpoint.as_of_date <= as_of)
+    return query.order_by(CashBalanceCheckpoint.as_of_date.desc()).first()
+
+
+def balance(location, currency_type, as_of=None):
+    """Balance of one location/currency at the end of ``as_of`` (default: now).
+
+    Starts from the newest checkpoint at or before that day and replays only
+    the transactions after it, so with nightly checkpoints the current
+    balance reads about a day of history.
+    """
+    checkpoint = _latest_checkpoint(location, currency_type, as_of)
+    start = checkpoint.balance if checkpoint else Decimal(0)
+    after_date = checkpoint.as_of_date if checkpoint else None
+    return Decimal(str(start)) + movements(currency_type, after_date, as_of)[location]
+
+
+def balances(as_of=None):
+    """``{(location, currency): balance}`` for every location and currency."""
+    return {(location, currency_type): balance(location, currency_type, as_of)
+            for location in LOCATIONS for currency_type in CURRENCIES}
+
+
+def create_checkpoints(as_of):
+    """Snapshot every balance at the end of ``as_of``, replacing any for that day."""
+    values = balances(as_of)
+    CashBalanceCheckpoint.query.filter_by(as_of_date=as_of).delete()
+    db.session.add_all(
+        CashBalanceCheckpoint(location=location, currency_type=currency_type,
+                              as_of_date=as_of, balance=amount)
+        for (location, currency_type), amount in values.items()
+    )
+    db.session.commit()
+    return values
+
+
+@app.cli.command('cash-checkpoint')
+@click.option('--date', 'as_of', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Day to snapshot (default: yesterday).')
+def cash_checkpoint_command(as_of):
+    """Snapshot vault and bank balances; schedule nightly."""
+    as_of = as_of.date() if as_of else date.today() - timedelta(days=1)
+    for (location, currency_type), amount in create_checkpoints(as_of).items():
+        print(f"{as_of} {location} {currency_type}: {amount:,.2f}")
+
+
+def _values(transaction_type, location, currency_type, amount, transaction_date,
+            description='', to_location=None, reference_type=None, reference_id=None,
+            recorded_by=None):
+    if transaction_type not in TRANSACTION_TYPES:
+        raise CashLedgerError('Unknown transaction type')
+    if location not in LOCATIONS:
+        raise CashLedgerError('Unknown location')
+    if currency_type not in CURRENCIES:
+        raise CashLedgerError('Unknown currency')
+    if amount <= 0:
+        raise CashLedgerError('Amount must be greater than zero')
+    if transaction_type == 'transfer' and (to_location not in LOCATIONS or to_location == location):
+        raise CashLedgerError('A transfer needs a different destination')
+
+    return {
+        'transaction_date': transaction_date,
+        'transaction_type': transaction_type,
+        'amount_usd': amount if currency_type == 'USD' else 0,
+        'amount_lrd': amount if currency_type == 'LRD' else 0,
+        'currency_type': currency_type,
+        'location': location,
+        'from_location': location if transaction_type == 'transfer' else None,
+        'to_location': to_location if transaction_type == 'transfer' else None,
+        'description': description,
+        'reference_type': reference_type or ('transfer' if transaction_type == 'transfer' else None),
+        'reference_id': reference_id,
+        'recorded_by': recorded_by,
+    }
+
+
+def _invalidate_checkpoints(connection, rows):
+    # A transaction dated on or before a checkpoint makes that checkpoint,
+    # and every later one, wrong; they are dropped and rebuilt next run.
+    earliest = {}
+    for row in rows:
+        for location in filter(None, (row['location'], row['to_location'])):
+            key = (location, row['currency_type'])
+            earliest[key] = min(earliest.get(key, row['transaction_date']), row['transaction_date'])
+    for (location, currency_type), transaction_date in sorted(earliest.items()):
+        connection.execute(delete(CashBalanceCheckpoint.__table__).where(
+            CashBalanceCheckpoint.location == location,
+            CashBalanceCheckpoint.currency_type == currency_type,
+            CashBalanceCheckpoint.as_of_date >= transaction_date
+        ))
+
+
+def _write(connection, rows):
+    connection.execute(insert(CashManagement.__table__), rows)
+    _invalidate_checkpoints(connection, rows)
+
+
+def record_transaction(transaction_type, location, currency_type, amount, transaction_date,
+                       **details):
+    """Record a manual deposit, withdrawal or transfer in the current transaction."""
+    _write(db.session.connection(),
+           [_values(transaction_type, location, currency_type, amount, transaction_date, **details)])
+
+
+# The columns a revenue or expense entry's cash posting is built from
+POSTING_COLUMNS = {
+    Revenue: ('id', 'booking_id', 'payment_date', 'currency_type', 'amount_usd', 'amount_lrd',
+              'payment_method', 'recorded_by'),
+    Expense: ('id', 'expense_date', 'category', 'description', 'currency_type', 'amount_usd',
+              'amount_lrd', 'payment_method', 'recorded_by'),
+}
+
+
+def _posting(model, values):
+    if model is Revenue:
+        transaction_type, reference_type, when = 'deposit', 'revenue', values['payment_date']
+        description = f"Payment for booking #{values['booking_id']}"
+    else:
+        transaction_type, reference_type, when = 'withdrawal', 'expense', values['expense_date']
+        description = f"{values['category']}: {values['description']}"
+
+    currency_type = values['currency_type']
+    amount = Decimal(str(values['amount_usd' if currency_type == 'USD' else 'amount_lrd'] or 0))
+    if currency_type not in CURRENCIES or amount <= 0:
+        return None
+    return _values(transaction_type, location_for(values.get('payment_method')), currency_type,
+                   amount, when, description=description, reference_type=reference_type,
+                   reference_id=values['id'], recorded_by=values.get('recorded_by'))
+
+
+def post_inserted(connection, model, rows):
+    """Post revenue or expense entries bulk-inserted as column dicts (with
+    their ``id``) to the cash ledger, in the caller's transaction."""
+    rows = [row for row in (_posting(model, values) for values in rows) if row]
+    if rows:
+        _write(connection, rows)
+
+
+# Every revenue and expense entry saved through the ORM posts to the cash
+# ledger in the same transaction; bulk inserts call post_inserted().
+@event.listens_for(Session, 'after_flush')
+def _post_revenue_and_expenses(session, flush_context):
+    rows = []
+    for obj in session.new:
+        if type(obj) in POSTING_COLUMNS:
+            rows.append(_posting(type(obj), {name: getattr(obj, name)
+                                             for name in POSTING_COLUMNS[type(obj)]}))
+    rows = [row for row in rows if row]
+    if rows:
+        _write(session.connection(), rows)
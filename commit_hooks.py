@@ -0,0 +1,46 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from itertools import chain
+
+# session.info key: {callback: set(keys)} waiting for the transaction to commit
+PENDING_KEY = 'pending_invalidations'
+
+
+def invalidate_on_commit(session, callback, keys=(True,)):
+    """Call ``callback(keys)`` once the session's transaction commits.
+
+    Nothing is called if it rolls back, so a worker never drops or refreshes
+    a cache for a write that didn't happen.
+    """
+    session.info.setdefault(PENDING_KEY, {}).setdefault(callback, set()).update(keys)
+
+
+def on_commit_invalidate(predicate, callback):
+    """Register a cache that goes stale when some flushed rows change.
+
+    ``predicate(session, obj)`` is asked about every new, changed and
+    deleted object in a flush and returns a key (e.g. the row's id) or a
+    falsy value; after the transaction commits, ``callback(keys)`` gets the
+    keys collected from all of its flushes.
+    """
+    @event.listens_for(Session, 'after_flush')
+    def _note_writes(session, flush_context):
+        keys = set()
+        for obj in chain(session.new, session.dirty, session.deleted):
+            key = predicate(session, obj)
+            if key:
+                keys.add(key)
+        if keys:
+            invalidate_on_commit(session, callback, keys)
+    return callback
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_after_commit(session):
+    for callback, keys in session.info.pop(PENDING_KEY, {}).items():
+        callback(keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
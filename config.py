@@ -0,0 +1,127 @@
+"""Named server profiles: gunicorn worker model and database pool sizing.
+
+APP_PROFILE picks a profile (default 'production' under gunicorn,
+'development' otherwise). Any value can be overridden from the
+environment, e.g. WEB_CONCURRENCY=3 or DB_POOL_SIZE=8.
+"""
+import multiprocessing
+import os
+
+PROFILES = {
+    # Flask dev server or a single sync worker on a laptop
+    'development': {
+        'worker_class': 'sync',
+        'workers_per_core': 0,
+        'min_workers': 1,
+        'threads': 1,
+        'preload_app': False,
+        'pool_size': 2,
+        'max_overflow': 2,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'statement_timeout_ms': 0,
+        'timeout': 120,
+    },
+    # Threaded workers: bcrypt and database waits release the GIL, so each
+    # worker serves several requests at once on one pool
+    'production': {
+        'worker_class': 'gthread',
+        'workers_per_core': 2,
+        'min_workers': 2,
+        'threads': 4,
+        'preload_app': True,
+        'pool_size': 4,
+        'max_overflow': 2,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'statement_timeout_ms': 15000,
+        'timeout': 30,
+    },
+    # Hosted Postgres plans with a small connection limit (e.g. 20-25)
+    'small': {
+        'worker_class': 'gthread',
+        'workers_per_core': 1,
+        'min_workers': 2,
+        'threads': 4,
+        'preload_app': True,
+        'pool_size': 3,
+        'max_overflow': 1,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'statement_timeout_ms': 15000,
+        'timeout': 30,
+    },
+}
+
+# Environment variable overriding each setting
+ENVIRONMENT = {
+    'worker_class': ('GUNICORN_WORKER_CLASS', str),
+    'workers': ('WEB_CONCURRENCY', int),
+    'threads': ('GUNICORN_THREADS', int),
+    'preload_app': ('GUNICORN_PRELOAD', lambda value: value not in ('0', 'false', 'no')),
+    'pool_size': ('DB_POOL_SIZE', int),
+    'max_overflow': ('DB_MAX_OVERFLOW', int),
+    'pool_timeout': ('DB_POOL_TIMEOUT', int),
+    'pool_recycle': ('DB_POOL_RECYCLE', int),
+    'statement_timeout_ms': ('DB_STATEMENT_TIMEOUT_MS', int),
+    'timeout': ('GUNICORN_TIMEOUT', int),
+}
+
+
+def profile_name(default='development'):
+    return os.environ.get('APP_PROFILE', default)
+
+
+def settings(name=None):
+    """The chosen profile with worker count and environment overrides applied.
+
+    The pool is per worker process, so at most workers * (pool_size +
+    max_overflow) connections are opened; DB_MAX_CONNECTIONS, when set,
+    shrinks the per-worker pool to fit under it.
+    """
+    name = name or profile_name()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown APP_PROFILE '{name}' (choose from {', '.join(PROFILES)})")
+    values = dict(PROFILES[name], profile=name)
+    values['workers'] = max(values['min_workers'],
+                            values['workers_per_core'] * multiprocessing.cpu_count() + 1)
+
+    for key, (variable, parse) in ENVIRONMENT.items():
+        if os.environ.get(variable):
+            values[key] = parse(os.environ[variable])
+
+    budget = os.environ.get('DB_MAX_CONNECTIONS')
+    if budget:
+        per_worker = max(int(budget) // values['workers'], 1)
+        values['max_overflow'] = max(min(values['max_overflow'], per_worker - values['pool_size']), 0)
+        values['pool_size'] = min(values['pool_size'], per_worker)
+    values['max_connections'] = values['workers'] * (values['pool_size'] + values['max_overflow'])
+    return values
+
+
+def engine_options(database_uri, values=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the profile."""
+    values = values or settings()
+    options = {'pool_pre_ping': True}
+    if database_uri.startswith('sqlite'):
+        return options
+
+    options.update(
+        pool_size=values['pool_size'],
+        max_overflow=values['max_overflow'],
+        pool_timeout=values['pool_timeout'],
+        pool_recycle=values['pool_recycle'],
+    )
+    if values['statement_timeout_ms'] and database_uri.startswith('postgresql'):
+        # A runaway query is cancelled instead of holding a worker and a connection
+        options['connect_args'] = {'options': f"-c statement_timeout={values['statement_timeout_ms']}"}
+    return options
+
+
+def describe(values):
+    return (f"profile {values['profile']}: {values['workers']} {values['worker_class']} workers "
+            f"x {values['threads']} threads, preload {'on' if values['preload_app'] else 'off'}; "
+            f"db pool {values['pool_size']}+{values['max_overflow']} per worker "
+            f"(max {values['max_connections']} connections), recycle {values['pool_recycle']}s, "
+            f"statement timeout " + (f"{values['statement_timeout_ms']}ms"
+                                     if values['statement_timeout_ms'] else 'off'))
@@ -0,0 +1,91 @@
+from app import db
+from models import Customer
+from sqlalchemy import func, or_
+
+# Typeahead results per page
+SEARCH_PAGE_SIZE = 20
+# Fuzzy matching only kicks in for queries at least this long
+FUZZY_MIN_LENGTH = 3
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _prefix(expression, prefix):
+    """``expression`` starts with ``prefix``, written so a btree index can serve it.
+
+    PostgreSQL uses LIKE 'abc%' against a text_pattern_ops index. SQLite
+    only uses an index for LIKE on a bare column, so it gets the equivalent
+    range 'abc' <= x < 'abd' instead.
+    """
+    if _dialect() == 'postgresql':
+        return expression.like(_escape_like(prefix) + '%', escape='\\')
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (expression >= prefix) & (expression < upper)
+
+
+def prefix_condition(query):
+    """Case-insensitive prefix match on name, phone or email."""
+    query = query.strip().lower()
+    return or_(
+        _prefix(func.lower(Customer.name), query),
+        _prefix(func.lower(Customer.email), query),
+        _prefix(Customer.phone, query),
+    )
+
+
+def _fuzzy(query, exclude_prefix):
+    """Matches elsewhere in the name: trigram similarity on PostgreSQL
+    (pg_trgm, GIN index), a plain substring scan on SQLite."""
+    columns = db.session.query(Customer.id, Customer.name, Customer.phone, Customer.email)
+    if _dialect() == 'postgresql':
+        fuzzy = columns.filter(Customer.name.op('%')(query)).order_by(
+            func.similarity(Customer.name, query).desc(), Customer.id)
+    else:
+        pattern = '%' + _escape_like(query.lower()) + '%'
+        fuzzy = columns.filter(func.lower(Customer.name).like(pattern, escape='\\')).order_by(
+            Customer.name, Customer.id)
+    # IS NOT TRUE, since a NULL email or phone makes the prefix test NULL
+    return fuzzy.filter(exclude_prefix.is_not(True))
+
+
+def search_customers(query, page=1, per_page=SEARCH_PAGE_SIZE):
+    """Return ``(results, has_more)`` for one page of typeahead matches.
+
+    Prefix matches come first in name order, served from the prefix
+    indexes; fuzzy matches fill up the remainder for longer queries.
+    """
+    query = (query or '').strip()
+    if not query:
+        return [], False
+
+    offset = (max(page, 1) - 1) * per_page
+    prefix = prefix_condition(query)
+    columns = db.session.query(Customer.id, Customer.name, Customer.phone, Customer.email)
+
+    rows = columns.filter(prefix).order_by(Customer.name, Customer.id).offset(offset).limit(per_page + 1).all()
+    if len(rows) > per_page or len(query) < FUZZY_MIN_LENGTH:
+        return [_result(r) for r in rows[:per_page]], len(rows) > per_page
+
+    # The prefix matches ran out on this page; continue into the fuzzy ones
+    prefix_total = offset + len(rows) if rows else columns.filter(prefix).count()
+    fuzzy_offset = max(offset - prefix_total, 0)
+    wanted = per_page - len(rows)
+    rows += _fuzzy(query, prefix).offset(fuzzy_offset).limit(wanted + 1).all()
+    return [_result(r) for r in rows[:per_page]], len(rows) > per_page
+
+
+def _result(row):
+    details = ', '.join(value for value in (row.phone, row.email) if value)
+    return {
+        'id': row.id,
+        'name': row.name,
+        'phone': row.phone,
+        'email': row.email,
+        'label': f'{row.name} ({details})' if details else row.name,
+    }
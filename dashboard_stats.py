@@ -0,0 +1,168 @@
+from app import app, db
+from models import Booking, Customer, Facility, Revenue, DashboardStat
+from sqlalchemy import event, func, select, insert, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+import upsert
+
+# Present only once the counters have been rebuilt from the base tables at
+# least once; until then the dashboard computes them without storing them.
+RECONCILED_KEY = 'reconciled'
+
+COUNTER_KEYS = ('total_bookings', 'pending_bookings', 'total_customers', 'total_facilities')
+
+
+def revenue_key(currency, day):
+    return 'revenue_%s:%04d-%02d' % (currency.lower(), day.year, day.month)
+
+
+def get_dashboard_stats(today=None):
+    """All dashboard figures in one primary-key lookup."""
+    today = today or date.today()
+    usd_key = revenue_key('USD', today)
+    lrd_key = revenue_key('LRD', today)
+    keys = list(COUNTER_KEYS) + [usd_key, lrd_key, RECONCILED_KEY]
+
+    values = dict(db.session.query(DashboardStat.stat_key, DashboardStat.value).filter(
+        DashboardStat.stat_key.in_(keys)).all())
+    if RECONCILED_KEY not in values:
+        # Counters not stored yet (`flask migrate` or `reconcile-stats` stores
+        # them); work them out without writing, so concurrent requests can't collide
+        values = compute_dashboard_stats(db.session.connection())
+
+    stats = {key: int(values.get(key) or 0) for key in COUNTER_KEYS}
+    stats['monthly_revenue_usd'] = values.get(usd_key) or 0
+    stats['monthly_revenue_lrd'] = values.get(lrd_key) or 0
+    return stats
+
+
+def compute_dashboard_stats(connection):
+    """Every counter, computed from the base tables."""
+    values = {
+        'total_bookings': connection.execute(select(func.count(Booking.id))).scalar(),
+        'pending_bookings': connection.execute(select(func.count(Booking.id)).where(
+            Booking.payment_status == 'pending')).scalar(),
+        'total_customers': connection.execute(select(func.count(Customer.id))).scalar(),
+        'total_facilities': connection.execute(select(func.count(Facility.id))).scalar(),
+        RECONCILED_KEY: 1,
+    }
+
+    year = func.extract('year', Revenue.payment_date)
+    month = func.extract('month', Revenue.payment_date)
+    monthly = connection.execute(select(
+        year, month, func.sum(Revenue.amount_usd), func.sum(Revenue.amount_lrd)
+    ).group_by(year, month)).all()
+    for y, m, usd, lrd in monthly:
+        day = date(int(y), int(m), 1)
+        values[revenue_key('USD', day)] = usd or 0
+        values[revenue_key('LRD', day)] = lrd or 0
+    return values
+
+
+def store_dashboard_stats(connection):
+    """Replace the stored counters with freshly computed ones, in the caller's transaction."""
+    values = compute_dashboard_stats(connection)
+    table = DashboardStat.__table__
+    connection.execute(delete(table))
+    connection.execute(insert(table), [{'stat_key': k, 'value': v} for k, v in values.items()])
+    return values
+
+
+def reconcile_dashboard_stats():
+    """Recompute every counter from the base tables and replace the stored ones.
+
+    Meant to run periodically to correct any drift, e.g. from bulk loads
+    that bypass the ORM.
+    """
+    values = store_dashboard_stats(db.session.connection())
+    db.session.commit()
+    return values
+
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Rebuild the dashboard counters from the base tables."""
+    values = reconcile_dashboard_stats()
+    print(f"Reconciled {len(values)} dashboard counters")
+
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+
+def _was_pending(obj):
+    history = get_history(obj, 'payment_status')
+    if history.deleted:
+        return history.deleted[0] == 'pending'
+    return obj.payment_status == 'pending'
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            deltas['total_bookings'] += 1
+            if obj.payment_status == 'pending':
+                deltas['pending_bookings'] += 1
+        elif isinstance(obj, Customer):
+            deltas['total_customers'] += 1
+        elif isinstance(obj, Facility):
+            deltas['total_facilities'] += 1
+        elif isinstance(obj, Revenue):
+            deltas[revenue_key('USD', obj.payment_date)] += _amount(obj.amount_usd)
+            deltas[revenue_key('LRD', obj.payment_date)] += _amount(obj.amount_lrd)
+
+    for obj in session.dirty:
+        if isinstance(obj, Booking) and get_history(obj, 'payment_status').has_changes():
+            deltas['pending_bookings'] += int(obj.payment_status == 'pending') - int(_was_pending(obj))
+
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            deltas['total_bookings'] -= 1
+            if _was_pending(obj):
+                deltas['pending_bookings'] -= 1
+        elif isinstance(obj, Customer):
+            deltas['total_customers'] -= 1
+        elif isinstance(obj, Facility):
+            deltas['total_facilities'] -= 1
+        elif isinstance(obj, Revenue):
+            deltas[revenue_key('USD', obj.payment_date)] -= _amount(obj.amount_usd)
+            deltas[revenue_key('LRD', obj.payment_date)] -= _amount(obj.amount_lrd)
+
+    return deltas
+
+
+def inserted_deltas(model, rows):
+    """Counter deltas for rows bulk-inserted into ``model``'s table as column dicts."""
+    deltas = defaultdict(int)
+    if model is Booking:
+        deltas['total_bookings'] += len(rows)
+        deltas['pending_bookings'] += sum(1 for values in rows if values['payment_status'] == 'pending')
+    elif model is Customer:
+        deltas['total_customers'] += len(rows)
+    elif model is Facility:
+        deltas['total_facilities'] += len(rows)
+    elif model is Revenue:
+        for values in rows:
+            deltas[revenue_key('USD', values['payment_date'])] += _amount(values['amount_usd'])
+            deltas[revenue_key('LRD', values['payment_date'])] += _amount(values['amount_lrd'])
+    return deltas
+
+
+def apply_deltas(connection, deltas):
+    for key, delta in deltas.items():
+        if delta:
+            upsert.increment(connection, DashboardStat.__table__,
+                             {'stat_key': key}, {'value': delta})
+
+
+# Counters move in the same transaction as the rows they count.
+@event.listens_for(Session, 'after_flush')
+def _update_dashboard_stats(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
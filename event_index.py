@@ -0,0 +1,80 @@
+from app import app
+from models import Event
+from commit_hooks import on_commit_invalidate
+import threading
+import time
+
+# Writes made by another gunicorn worker can't invalidate this worker's copy,
+# so the index is also rebuilt once it is older than this many seconds.
+app.config.setdefault('EVENT_INDEX_TTL', 300)
+
+_lock = threading.Lock()
+_state = {'version': 0, 'index': None}
+
+
+class FacilityEventIndex:
+    """facility_id -> events, built once from ``Event.allowed_facilities``."""
+
+    def __init__(self, events, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.by_facility = {}
+        self.facilities_by_event = {}
+
+        for event in events:
+            facility_ids = set(_facility_ids(event.allowed_facilities))
+            self.facilities_by_event[event.id] = facility_ids
+            summary = {
+                'id': event.id,
+                'name': event.name,
+                'description': event.description
+            }
+            for facility_id in facility_ids:
+                self.by_facility.setdefault(facility_id, []).append(summary)
+
+        for summaries in self.by_facility.values():
+            summaries.sort(key=lambda e: e['name'])
+
+    def is_fresh(self, version):
+        age = time.monotonic() - self.built_at
+        return self.version == version and age < app.config['EVENT_INDEX_TTL']
+
+
+def _facility_ids(allowed_facilities):
+    for facility_id in allowed_facilities or []:
+        try:
+            yield int(facility_id)
+        except (TypeError, ValueError):
+            continue
+
+
+def get_index():
+    index = _state['index']
+    if index is not None and index.is_fresh(_state['version']):
+        return index
+
+    with _lock:
+        index = _state['index']
+        version = _state['version']
+        if index is None or not index.is_fresh(version):
+            index = FacilityEventIndex(Event.query.all(), version)
+            _state['index'] = index
+        return index
+
+
+def invalidate():
+    with _lock:
+        _state['version'] += 1
+
+
+def events_for_facility(facility_id):
+    return list(get_index().by_facility.get(int(facility_id), []))
+
+
+def is_event_allowed(event_id, facility_id):
+    allowed = get_index().facilities_by_event.get(int(event_id))
+    return allowed is not None and int(facility_id) in allowed
+
+
+# Drop this worker's index once a transaction that wrote events commits.
+on_commit_invalidate(lambda session, obj: isinstance(obj, Event), lambda keys: invalidate())
@@ -0,0 +1,95 @@
+from app import db
+from models import Booking, Revenue, Expense, Facility, Event, Customer
+from report_engine import revenue_rows, expense_rows, filter_groups
+from datetime import date, datetime
+from decimal import Decimal
+import csv
+import io
+import json
+
+# Rows fetched from the server-side cursor per round-trip
+EXPORT_BATCH_SIZE = 1000
+
+# Rows written per chunk of the response body
+CHUNK_ROWS = 200
+
+# Full-history exports use this range
+ALL_TIME = (date(1900, 1, 1), date(9999, 12, 31))
+
+
+def booking_rows(start_date, end_date, facility_id=None, event_id=None, customer_id=None):
+    """Id/label projection of the bookings in a range."""
+    query = db.session.query(
+        Booking.id, Booking.booking_date, Booking.total_fee_usd,
+        Booking.advance_paid_usd, Booking.advance_paid_lrd,
+        Booking.payment_status, Booking.booking_status,
+        Facility.name.label('facility'), Event.name.label('event'),
+        Customer.name.label('customer')
+    ).select_from(Booking).join(Facility).join(Event).join(Customer).filter(
+        Booking.booking_date.between(start_date, end_date)
+    )
+    return filter_groups(query, Booking, facility_id, event_id, customer_id)
+
+
+# kind -> (row query, sort order)
+EXPORTS = {
+    'revenue': (revenue_rows, (Revenue.payment_date, Revenue.id)),
+    'expenses': (expense_rows, (Expense.expense_date, Expense.id)),
+    'bookings': (booking_rows, (Booking.booking_date, Booking.id)),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_query(kind, start_date, end_date, **filters):
+    """The export's rows, streamed from a server-side cursor in batches."""
+    rows, order = EXPORTS[kind]
+    query = rows(start_date, end_date, **filters).order_by(*order)
+    return query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_csv(query):
+    """Yield the CSV text in chunks; only one chunk is ever held in memory."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column['name'] for column in query.column_descriptions])
+    # Send the header straight away so the download starts immediately
+    yield _drain(buffer)
+
+    for count, row in enumerate(query, 1):
+        writer.writerow([_plain(value) for value in row])
+        if count % CHUNK_ROWS == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+
+def stream_ndjson(query):
+    """Yield one JSON object per line."""
+    names = [column['name'] for column in query.column_descriptions]
+    for row in query:
+        yield json.dumps({name: _plain(value) for name, value in zip(names, row)}) + '\n'
+
+
+def stream_export(kind, fmt, start_date, end_date, **filters):
+    query = export_query(kind, start_date, end_date, **filters)
+    if fmt == 'ndjson':
+        return stream_ndjson(query)
+    return stream_csv(query)
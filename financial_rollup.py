@@ -0,0 +1,155 @@
+from app import app, db
+from models import FinancialDaily, Revenue, Expense, Booking
+import upsert
+from sqlalchemy import event, func, select, insert, delete, literal, String
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from collections import defaultdict
+from decimal import Decimal
+import click
+
+# Columns that place a payment or expense in the rollup
+ROLLUP_ATTRIBUTES = {
+    Revenue: ('payment_date', 'booking_id', 'currency_type', 'amount_usd', 'amount_lrd'),
+    Expense: ('expense_date', 'facility_id', 'event_id', 'customer_id', 'currency_type',
+              'amount_usd', 'amount_lrd'),
+}
+
+
+def _raw_totals(kind, start_date=None, end_date=None):
+    """SELECT of the rollup rows computed from the raw table."""
+    if kind == 'revenue':
+        query = select(
+            Revenue.payment_date, literal('revenue', String),
+            Booking.facility_id, Booking.event_id, Booking.customer_id, Revenue.currency_type,
+            func.coalesce(func.sum(Revenue.amount_usd), 0),
+            func.coalesce(func.sum(Revenue.amount_lrd), 0),
+            func.count(Revenue.id)
+        ).select_from(Revenue).join(Booking, Booking.id == Revenue.booking_id)
+        day = Revenue.payment_date
+    else:
+        query = select(
+            Expense.expense_date, literal('expense', String),
+            func.coalesce(Expense.facility_id, 0), func.coalesce(Expense.event_id, 0),
+            func.coalesce(Expense.customer_id, 0), Expense.currency_type,
+            func.coalesce(func.sum(Expense.amount_usd), 0),
+            func.coalesce(func.sum(Expense.amount_lrd), 0),
+            func.count(Expense.id)
+        )
+        day = Expense.expense_date
+    if start_date is not None:
+        query = query.where(day >= start_date)
+    if end_date is not None:
+        query = query.where(day <= end_date)
+    # Everything but the kind label and the sums
+    columns = list(query.selected_columns)
+    return query.group_by(columns[0], *columns[2:6])
+
+
+def rebuild_rollup(connection, start_date=None, end_date=None):
+    """Recompute the rollup for a date range (default: all of it) from the raw rows."""
+    where = []
+    if start_date is not None:
+        where.append(FinancialDaily.day >= start_date)
+    if end_date is not None:
+        where.append(FinancialDaily.day <= end_date)
+    connection.execute(delete(FinancialDaily.__table__).where(*where))
+
+    columns = ['day', 'kind', 'facility_id', 'event_id', 'customer_id', 'currency_type',
+               'amount_usd', 'amount_lrd', 'entries']
+    for kind in ('revenue', 'expense'):
+        connection.execute(insert(FinancialDaily.__table__).from_select(
+            columns, _raw_totals(kind, start_date, end_date)))
+
+
+@app.cli.command('rebuild-rollup')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day (default: all history).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day (default: all history).')
+def rebuild_rollup_command(start, end):
+    """Rebuild the daily revenue/expense rollup from the raw tables."""
+    rebuild_rollup(db.session.connection(), start and start.date(), end and end.date())
+    db.session.commit()
+    print(f"Rebuilt {FinancialDaily.query.count()} rollup rows")
+
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+
+def _snapshot(obj, old=False):
+    """The rollup-relevant values of ``obj``, as they are or as they were before this flush."""
+    values = {}
+    for name in ROLLUP_ATTRIBUTES[type(obj)]:
+        history = get_history(obj, name) if old else None
+        values[name] = history.deleted[0] if history and history.deleted else getattr(obj, name)
+    return values
+
+
+def _collect_changes(session):
+    """``[(sign, model, values)]`` for the payments and expenses in this flush."""
+    changes = []
+    for obj in session.new:
+        if type(obj) in ROLLUP_ATTRIBUTES:
+            changes.append((1, type(obj), _snapshot(obj)))
+    for obj in session.deleted:
+        if type(obj) in ROLLUP_ATTRIBUTES:
+            changes.append((-1, type(obj), _snapshot(obj, old=True)))
+    for obj in session.dirty:
+        if type(obj) in ROLLUP_ATTRIBUTES and any(
+                get_history(obj, name).has_changes() for name in ROLLUP_ATTRIBUTES[type(obj)]):
+            changes.append((-1, type(obj), _snapshot(obj, old=True)))
+            changes.append((1, type(obj), _snapshot(obj)))
+    return changes
+
+
+def _deltas(connection, changes):
+    # Form values may still be strings until the row is reloaded
+    booking_ids = {int(values['booking_id']) for _, model, values in changes
+                   if model is Revenue and values['booking_id'] is not None}
+    bookings = {}
+    if booking_ids:
+        bookings = {row.id: row for row in connection.execute(
+            select(Booking.id, Booking.facility_id, Booking.event_id, Booking.customer_id)
+            .where(Booking.id.in_(booking_ids)))}
+
+    deltas = defaultdict(lambda: [Decimal(0), Decimal(0), 0])
+    for sign, model, values in changes:
+        if model is Revenue:
+            booking = values['booking_id'] is not None and bookings.get(int(values['booking_id']))
+            if not booking:
+                continue
+            key = (values['payment_date'], 'revenue', booking.facility_id, booking.event_id,
+                   booking.customer_id, values['currency_type'])
+        else:
+            key = (values['expense_date'], 'expense', int(values['facility_id'] or 0),
+                   int(values['event_id'] or 0), int(values['customer_id'] or 0),
+                   values['currency_type'])
+        total = deltas[key]
+        total[0] += sign * _amount(values['amount_usd'])
+        total[1] += sign * _amount(values['amount_lrd'])
+        total[2] += sign
+    return deltas
+
+
+def _apply(connection, changes):
+    for (day, kind, facility_id, event_id, customer_id, currency_type), (usd, lrd, entries) in \
+            sorted(_deltas(connection, changes).items()):
+        upsert.increment(connection, FinancialDaily.__table__,
+                         {'day': day, 'kind': kind, 'facility_id': facility_id, 'event_id': event_id,
+                          'customer_id': customer_id, 'currency_type': currency_type},
+                         {'amount_usd': usd, 'amount_lrd': lrd, 'entries': entries})
+
+
+def add_inserted(connection, model, rows):
+    """Roll payments or expenses bulk-inserted as column dicts into the rollup."""
+    _apply(connection, [(1, model, values) for values in rows])
+
+
+# The rollup moves in the same transaction as the payments and expenses,
+# like the dashboard counters. Bulk Core inserts call add_inserted() instead,
+# or rebuild the rollup afterwards (seeding).
+@event.listens_for(Session, 'after_flush')
+def _update_rollup(session, flush_context):
+    changes = _collect_changes(session)
+    if changes:
+        _apply(session.connection(), changes)
@@ -0,0 +1,33 @@
+# Gunicorn settings come from the server profile in config.py
+import os
+
+os.environ.setdefault('APP_PROFILE', 'production')
+
+import config
+
+_settings = config.settings()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = _settings['workers']
+worker_class = _settings['worker_class']
+threads = _settings['threads']
+preload_app = _settings['preload_app']
+timeout = _settings['timeout']
+keepalive = 5
+# Recycle workers now and then so slow leaks can't build up
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = '-'
+
+
+def when_ready(server):
+    server.log.info(config.describe(_settings))
+
+
+def post_fork(server, worker):
+    # With preload_app the master imported the app; connections it may have
+    # opened must not be shared with the workers
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+        worker.log.info(f'worker {worker.pid} db pool: {db.engine.pool.status()}')
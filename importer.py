@@ -0,0 +1,379 @@
+from app import app, db
+from models import Customer, Booking, Expense, Facility, Event, Revenue
+from event_index import is_event_allowed
+from booking_service import is_date_conflict
+from availability import is_active
+from settings_cache import usd_to_lrd_rate
+import cash_ledger
+import dashboard_stats
+import financial_rollup
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import click
+import csv
+import io
+
+# Rows validated and written per transaction
+IMPORT_CHUNK_SIZE = 1000
+
+# Amounts must fit the narrowest money column, Numeric(10, 2)
+MAX_AMOUNT = Decimal('1e8')
+
+BOOKING_STATUSES = ('pending', 'confirmed', 'cancelled')
+CURRENCIES = ('USD', 'LRD')
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.inserted = 0
+        self.errors = []  # (line, message)
+        self.file_error = None  # why reading stopped early, if it did
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def errors_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['line', 'error'])
+        writer.writerows(self.errors)
+        return buffer.getvalue()
+
+
+def _text(row, name, max_length, required=False):
+    value = (row.get(name) or '').strip()
+    if required and not value:
+        raise RowError(f'{name} is required')
+    if len(value) > max_length:
+        raise RowError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _int(row, name, required=False):
+    value = (row.get(name) or '').strip()
+    if not value:
+        if required:
+            raise RowError(f'{name} is required')
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f'{name} must be a whole number')
+
+
+def _date(row, name):
+    try:
+        return datetime.strptime((row.get(name) or '').strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise RowError(f'{name} must be a YYYY-MM-DD date')
+
+
+def _money(row, name, default=Decimal(0)):
+    value = (row.get(name) or '').strip()
+    if not value:
+        return default
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f'{name} must be a number')
+    if not amount.is_finite():
+        raise RowError(f'{name} must be a number')
+    if amount < 0:
+        raise RowError(f'{name} cannot be negative')
+    if amount >= MAX_AMOUNT:
+        raise RowError(f'{name} must be less than {MAX_AMOUNT:,.0f}')
+    return amount
+
+
+def _choice(row, name, choices, default):
+    value = (row.get(name) or '').strip() or default
+    if value not in choices:
+        raise RowError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+class CustomerImport:
+    model = Customer
+
+    def prepare(self, chunk):
+        pass
+
+    def parse(self, row):
+        return {
+            'name': _text(row, 'name', 200, required=True),
+            'address': _text(row, 'address', 10000),
+            'phone': _text(row, 'phone', 20),
+            'email': _text(row, 'email', 100),
+        }
+
+
+class BookingImport:
+    model = Booking
+
+    def __init__(self):
+        self.fees = dict(db.session.query(Facility.id, Facility.usd_fee).all())
+        self.claimed = set()
+
+    def prepare(self, chunk):
+        # One query per chunk for the referenced customers and for the dates
+        # already taken, instead of one per row
+        customer_ids = {_safe_int(row.get('customer_id')) for _, row in chunk}
+        self.customers = {customer_id for (customer_id,) in db.session.query(Customer.id).filter(
+            Customer.id.in_(customer_ids - {None}))}
+
+        facility_ids = {_safe_int(row.get('facility_id')) for _, row in chunk} - {None}
+        dates = {_safe_date(row.get('booking_date')) for _, row in chunk} - {None}
+        self.taken = set()
+        if facility_ids and dates:
+            self.taken = set(db.session.query(Booking.facility_id, Booking.booking_date).filter(
+                Booking.facility_id.in_(facility_ids),
+                Booking.booking_date.between(min(dates), max(dates)),
+                is_active()
+            ).all())
+
+    def parse(self, row):
+        customer_id = _int(row, 'customer_id', required=True)
+        facility_id = _int(row, 'facility_id', required=True)
+        event_id = _int(row, 'event_id', required=True)
+        booking_date = _date(row, 'booking_date')
+
+        if customer_id not in self.customers:
+            raise RowError(f'customer {customer_id} does not exist')
+        if facility_id not in self.fees:
+            raise RowError(f'facility {facility_id} does not exist')
+        if not is_event_allowed(event_id, facility_id):
+            raise RowError(f'event {event_id} cannot be held in facility {facility_id}')
+
+        values = {
+            'customer_id': customer_id,
+            'facility_id': facility_id,
+            'event_id': event_id,
+            'booking_date': booking_date,
+            'total_fee_usd': _money(row, 'total_fee_usd', self.fees[facility_id]),
+            'advance_paid_usd': _money(row, 'advance_paid_usd'),
+            'advance_paid_lrd': _money(row, 'advance_paid_lrd'),
+            'booking_status': _choice(row, 'booking_status', BOOKING_STATUSES, 'pending'),
+            'notes': _text(row, 'notes', 10000),
+        }
+        values['payment_status'] = self._payment_status(values)
+
+        if values['booking_status'] != 'cancelled':
+            key = (facility_id, booking_date)
+            if key in self.taken or key in self.claimed:
+                raise RowError(f'facility {facility_id} is already booked on {booking_date}')
+            self.claimed.add(key)
+        return values
+
+    def _payment_status(self, values):
+        rate = usd_to_lrd_rate()
+        paid_in_lrd = values['advance_paid_usd'] * rate + values['advance_paid_lrd']
+        if paid_in_lrd >= values['total_fee_usd'] * rate:
+            return 'complete'
+        return 'partial' if paid_in_lrd > 0 else 'pending'
+
+    def after_insert(self, booking_ids, rows):
+        # Advance payments get their Revenue rows, so the booking totals
+        # agree with the revenue table (see ledger.py)
+        payments = []
+        for booking_id, values in zip(booking_ids, rows):
+            for currency_type, amount in (('USD', values['advance_paid_usd']),
+                                          ('LRD', values['advance_paid_lrd'])):
+                if amount > 0:
+                    payments.append({
+                        'booking_id': booking_id,
+                        'payment_date': values['booking_date'],
+                        'amount_usd': amount if currency_type == 'USD' else Decimal(0),
+                        'amount_lrd': amount if currency_type == 'LRD' else Decimal(0),
+                        'currency_type': currency_type,
+                        'notes': 'Imported advance payment',
+                    })
+        if payments:
+            _insert_rows(Revenue, payments)
+
+
+class ExpenseImport:
+    model = Expense
+
+    def prepare(self, chunk):
+        # One query per referenced table and chunk, as for bookings
+        self.existing = {}
+        for name, model in (('booking_id', Booking), ('facility_id', Facility),
+                            ('event_id', Event), ('customer_id', Customer)):
+            ids = {_safe_int(row.get(name)) for _, row in chunk} - {None}
+            self.existing[name] = {found for (found,) in db.session.query(model.id).filter(
+                model.id.in_(ids))} if ids else set()
+
+    def _reference(self, row, name):
+        value = _int(row, name)
+        if value is not None and value not in self.existing[name]:
+            raise RowError(f"{name.replace('_id', '')} {value} does not exist")
+        return value
+
+    def parse(self, row):
+        currency_type = _choice(row, 'currency_type', CURRENCIES, None)
+        amount = _money(row, 'amount', None)
+        if amount is None:
+            raise RowError('amount is required')
+        facility_id = self._reference(row, 'facility_id')
+        event_id = self._reference(row, 'event_id')
+        if facility_id is not None and event_id is not None and not is_event_allowed(event_id, facility_id):
+            raise RowError(f'event {event_id} cannot be held in facility {facility_id}')
+        return {
+            'booking_id': self._reference(row, 'booking_id'),
+            'facility_id': facility_id,
+            'event_id': event_id,
+            'customer_id': self._reference(row, 'customer_id'),
+            'expense_date': _date(row, 'expense_date'),
+            'category': _text(row, 'category', 100, required=True),
+            'description': _text(row, 'description', 10000, required=True),
+            'amount_usd': amount if currency_type == 'USD' else Decimal(0),
+            'amount_lrd': amount if currency_type == 'LRD' else Decimal(0),
+            'currency_type': currency_type,
+            'payment_method': _text(row, 'payment_method', 50) or 'cash',
+            'receipt_number': _text(row, 'receipt_number', 50),
+        }
+
+
+IMPORTERS = {
+    'customers': CustomerImport,
+    'bookings': BookingImport,
+    'expenses': ExpenseImport,
+}
+
+
+def _safe_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _safe_date(value):
+    try:
+        return datetime.strptime((value or '').strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def _chunks(reader):
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_rows(model, rows, returning=False):
+    """Multi-row INSERT of ``rows``, moving the dashboard counters and the
+    daily rollup and posting payments and expenses to the cash ledger in
+    the same transaction (the flush listeners don't see Core inserts)."""
+    table = model.__table__
+    ids = None
+    if returning or model in cash_ledger.POSTING_COLUMNS:
+        # Multi-row INSERT ... RETURNING, with ids in the order of the rows
+        ids = db.session.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    else:
+        db.session.execute(insert(table), rows)
+
+    connection = db.session.connection()
+    dashboard_stats.apply_deltas(connection, dashboard_stats.inserted_deltas(model, rows))
+    if model in financial_rollup.ROLLUP_ATTRIBUTES:
+        financial_rollup.add_inserted(connection, model, rows)
+    if model in cash_ledger.POSTING_COLUMNS:
+        cash_ledger.post_inserted(connection, model,
+                                  [dict(values, id=row_id) for row_id, values in zip(ids, rows)])
+    return ids
+
+
+def _insert(importer, rows):
+    if not hasattr(importer, 'after_insert'):
+        _insert_rows(importer.model, rows)
+        return
+    ids = _insert_rows(importer.model, rows, returning=True)
+    importer.after_insert(ids, rows)
+
+
+def _write_chunk(importer, rows, report):
+    try:
+        _insert(importer, [values for _, values in rows])
+        db.session.commit()
+        report.inserted += len(rows)
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    # Something in the chunk was rejected by the database (e.g. another
+    # clerk booked one of the dates meanwhile); find out which rows.
+    for line, values in rows:
+        try:
+            _insert(importer, [values])
+            db.session.commit()
+            report.inserted += 1
+        except IntegrityError as e:
+            db.session.rollback()
+            if is_date_conflict(e):
+                report.error(line, 'facility is already booked on that date')
+            else:
+                report.error(line, str(e.orig))
+
+
+def import_csv(kind, text_stream):
+    """Validate and bulk-insert a CSV of customers, bookings or expenses.
+
+    The file is read and written IMPORT_CHUNK_SIZE rows at a time, each
+    chunk as one multi-row INSERT in its own transaction. Rows that fail
+    validation are skipped and listed in the report with their line number.
+    A file that can't be decoded or parsed stops the import at that point,
+    keeping the chunks already written, and sets ``report.file_error``.
+    """
+    importer = IMPORTERS[kind]()
+    report = ImportReport(kind)
+    reader = csv.DictReader(text_stream)
+
+    try:
+        for chunk in _chunks(reader):
+            importer.prepare(chunk)
+            rows = []
+            for line, row in chunk:
+                try:
+                    rows.append((line, importer.parse(row)))
+                except RowError as e:
+                    report.error(line, str(e))
+            if rows:
+                _write_chunk(importer, rows, report)
+    except (csv.Error, UnicodeDecodeError) as e:
+        report.file_error = f'could not read the file after line {reader.line_num}: {e}'
+    return report
+
+
+@app.cli.command('import-csv')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+              help='Write the per-row error report to this CSV file.')
+def import_csv_command(kind, path, errors_path):
+    """Bulk-import customers, bookings or expenses from a CSV file."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        report = import_csv(kind, f)
+
+    print(f"Imported {report.inserted} {kind}, {len(report.errors)} rows rejected")
+    if report.file_error:
+        print(f"Stopped early: {report.file_error}")
+    if errors_path and report.errors:
+        with open(errors_path, 'w', newline='') as f:
+            f.write(report.errors_csv())
+        print(f"Error report written to {errors_path}")
+    else:
+        for line, message in report.errors[:20]:
+            print(f"  line {line}: {message}")
@@ -0,0 +1,208 @@
+from app import app
+from flask import g, request, Response, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import defaultdict
+from contextlib import contextmanager
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+
+# Statements slower than this (ms) are logged with their fingerprint
+app.config.setdefault('SLOW_QUERY_MS', float(os.environ.get('SLOW_QUERY_MS', 200)))
+# Add a Server-Timing header with the SQL/render/bcrypt split to every response
+app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING', '1') != '0')
+# When set, /metrics requires "Authorization: Bearer <token>"; without it,
+# /metrics only answers requests from this machine
+app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_query_log = logging.getLogger('dujar.slow_query')
+
+_FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                    # string literals
+    (re.compile(r'%\(\w+\)s|:\w+|\$\d+'), '?'),              # named/numbered parameters
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),                 # numbers
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?+)'),      # IN lists of any length
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(statement):
+    """The statement with literals and parameters replaced, so that runs
+    differing only in values group together."""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class Metrics:
+    """Per-process request metrics, rendered in the Prometheus text format.
+
+    Each gunicorn worker keeps its own numbers; Prometheus sums them when
+    every worker is scraped, or the scrape sees one worker at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self.duration_sum = defaultdict(float)
+        self.requests = defaultdict(int)
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.render_seconds = defaultdict(float)
+        self.slow_queries = defaultdict(int)
+
+    def observe(self, endpoint, status, stats, duration):
+        with self._lock:
+            self.buckets[endpoint][bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            self.duration_sum[endpoint] += duration
+            self.requests[(endpoint, status)] += 1
+            self.sql_queries[endpoint] += stats['sql_count']
+            self.sql_seconds[endpoint] += stats['sql_time']
+            self.render_seconds[endpoint] += stats['render_time']
+            self.slow_queries[endpoint] += stats['slow_queries']
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines += ['# HELP dujar_request_duration_seconds Request latency by endpoint.',
+                      '# TYPE dujar_request_duration_seconds histogram']
+            for endpoint, counts in sorted(self.buckets.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'dujar_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'dujar_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.duration_sum[endpoint]:.6f}')
+                lines.append(f'dujar_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+
+            lines += ['# HELP dujar_requests_total Requests by endpoint and status.',
+                      '# TYPE dujar_requests_total counter']
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'dujar_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            for name, help_text, values in (
+                ('dujar_sql_queries_total', 'SQL statements executed by endpoint.', self.sql_queries),
+                ('dujar_sql_seconds_total', 'Time spent in SQL by endpoint.', self.sql_seconds),
+                ('dujar_render_seconds_total', 'Time spent rendering templates by endpoint.', self.render_seconds),
+                ('dujar_slow_queries_total', 'Statements over SLOW_QUERY_MS by endpoint.', self.slow_queries),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, value in sorted(values.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _stats():
+    # The current request's counters, or None outside a request
+    return g.get('request_stats') if g else None
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the request's ``name`` timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _stats()
+        if stats is not None:
+            stats['timings'][name] += time.perf_counter() - started
+
+
+# Statements on one connection never overlap, so it holds a single start
+# time; one that fails leaves it behind to be overwritten by the next.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started')
+    stats = _stats()
+    slow = elapsed * 1000 >= app.config['SLOW_QUERY_MS']
+
+    if stats is not None:
+        stats['sql_count'] += 1
+        stats['sql_time'] += elapsed
+        if elapsed > stats['slowest'][0]:
+            stats['slowest'] = (elapsed, statement)
+        stats['slow_queries'] += slow
+    if slow:
+        slow_query_log.warning('%.1fms %s [%s]', elapsed * 1000, fingerprint(statement),
+                               request.endpoint if stats is not None else 'no request')
+
+
+@before_render_template.connect_via(app)
+def _before_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        stats['render_started'].append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _after_render(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None and stats['render_started']:
+        elapsed = time.perf_counter() - stats['render_started'].pop()
+        # Only the outermost render counts; includes are part of it
+        if not stats['render_started']:
+            stats['render_time'] += elapsed
+
+
+@app.before_request
+def _start_request_stats():
+    g.request_stats = {
+        'started': time.perf_counter(),
+        'sql_count': 0,
+        'sql_time': 0.0,
+        'slowest': (0.0, None),
+        'slow_queries': 0,
+        'render_time': 0.0,
+        'render_started': [],
+        'timings': defaultdict(float),
+    }
+
+
+@app.after_request
+def _finish_request_stats(response):
+    stats = _stats()
+    if stats is None:
+        return response
+    duration = time.perf_counter() - stats['started']
+    endpoint = request.endpoint or 'unmatched'
+    if endpoint not in ('metrics', 'static'):
+        metrics.observe(endpoint, response.status_code, stats, duration)
+
+    if app.config['SERVER_TIMING']:
+        timings = [
+            f'db;dur={stats["sql_time"] * 1000:.1f};desc="{stats["sql_count"]} queries"',
+            f'db-slowest;dur={stats["slowest"][0] * 1000:.1f}',
+            f'render;dur={stats["render_time"] * 1000:.1f}',
+        ]
+        timings += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stats['timings'].items()]
+        timings.append(f'total;dur={duration * 1000:.1f}')
+        response.headers.add('Server-Timing', ', '.join(timings))
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+    elif request.remote_addr not in LOCAL_ADDRESSES:
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
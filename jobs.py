@@ -0,0 +1,214 @@
+from app import app, db
+from models import Job, TableVersion
+from exports import stream_export, EXPORTS, FORMATS, ALL_TIME
+from report_engine import report_date_range, income_expense_summary, group_filter
+from sqlalchemy import update, delete, or_, and_, text
+from datetime import datetime, timedelta
+import click
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+
+# Seconds an idle worker waits before looking for new jobs
+app.config.setdefault('JOB_POLL_SECONDS', float(os.environ.get('JOB_POLL_SECONDS', 2)))
+# A job running longer than this (seconds) is cancelled on PostgreSQL, and a
+# job whose worker died is picked up again after it
+app.config.setdefault('JOB_TIMEOUT', int(os.environ.get('JOB_TIMEOUT', 900)))
+# Runs a job gets before it is marked failed
+app.config.setdefault('JOB_MAX_ATTEMPTS', int(os.environ.get('JOB_MAX_ATTEMPTS', 3)))
+# Finished jobs and their results are deleted after this many days
+app.config.setdefault('JOB_RESULT_DAYS', int(os.environ.get('JOB_RESULT_DAYS', 7)))
+
+# Roles that may see and download any user's jobs; others only their own
+JOB_VIEWER_ROLES = ('admin', 'manager')
+
+
+class JobError(Exception):
+    pass
+
+
+def _export_params(args):
+    export = args.get('export')
+    fmt = args.get('format', 'csv')
+    if export not in EXPORTS or fmt not in FORMATS:
+        raise JobError('Unknown export')
+    if args.get('all') == '1':
+        start_date, end_date = ALL_TIME
+    else:
+        start_date, end_date = report_date_range(args)
+    params = {'export': export, 'format': fmt,
+              'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+    for name in ('facility_id', 'event_id', 'customer_id'):
+        value = args.get(name, type=group_filter)
+        if value is not None:
+            params[name] = value
+    return params
+
+
+def _report_params(args):
+    start_date, end_date = report_date_range(args)
+    return {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+
+
+def _dates(params):
+    return (datetime.strptime(params['start_date'], '%Y-%m-%d').date(),
+            datetime.strptime(params['end_date'], '%Y-%m-%d').date())
+
+
+def run_export(params):
+    start_date, end_date = _dates(params)
+    filters = {name: params[name] for name in ('facility_id', 'event_id', 'customer_id') if name in params}
+    body = ''.join(stream_export(params['export'], params['format'], start_date, end_date, **filters))
+    filename = f"{params['export']}_{params['start_date']}_{params['end_date']}.{params['format']}"
+    return body.encode('utf-8'), FORMATS[params['format']], filename
+
+
+def run_report(params):
+    """The income/expense report's grouped rows and subtotals as CSV."""
+    summary = income_expense_summary(*_dates(params))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['section', 'level', 'facility', 'event', 'customer', 'entries', 'amount_usd', 'amount_lrd'])
+    for section in ('revenue', 'expense'):
+        for row in summary[f'{section}_rows']:
+            writer.writerow([section, row.level, row.facility or '', row.event or '', row.customer or '',
+                             row.entries, row.amount_usd, row.amount_lrd])
+    writer.writerow(['net', 'total', '', '', '', '', summary['net_usd'], summary['net_lrd']])
+    filename = f"income_expense_{params['start_date']}_{params['end_date']}.csv"
+    return buffer.getvalue().encode('utf-8'), 'text/csv', filename
+
+
+# kind -> (request arguments -> params, params -> (body, mimetype, filename), tables read)
+JOB_KINDS = {
+    'export': (_export_params, run_export,
+               ('revenue', 'expenses', 'bookings', 'facilities', 'events', 'customers')),
+    'report': (_report_params, run_report,
+               ('financial_daily', 'facilities', 'events', 'customers')),
+}
+
+
+def data_version(kind):
+    """The write versions (see response_cache.py) of the tables a job reads."""
+    tables = JOB_KINDS[kind][2]
+    versions = dict(db.session.query(TableVersion.table_name, TableVersion.version).filter(
+        TableVersion.table_name.in_(tables)).all())
+    return ','.join(f'{table}={versions.get(table, 0)}' for table in tables)
+
+
+def enqueue(kind, args, user_id=None, any_owner=False):
+    """Queue a job for ``kind`` with the parameters in ``args``, or return the
+    queued, running or finished job that already answers it.
+
+    Jobs are matched on a hash of their parameters and on the data version,
+    so a result is reused until one of the tables it was built from changes.
+    Only ``user_id``'s own jobs are reused unless ``any_owner`` is set.
+    """
+    if kind not in JOB_KINDS:
+        raise JobError('Unknown job')
+    params = json.dumps(JOB_KINDS[kind][0](args), sort_keys=True)
+    params_hash = hashlib.sha1(f'{kind}:{params}'.encode('utf-8')).hexdigest()
+    version = data_version(kind)
+
+    query = Job.query.filter(
+        Job.params_hash == params_hash,
+        Job.data_version == version,
+        Job.status.in_(('queued', 'running', 'done'))
+    )
+    if not any_owner:
+        query = query.filter(Job.created_by.is_not_distinct_from(user_id))
+    job = query.order_by(Job.id.desc()).first()
+    if job is None:
+        job = Job(kind=kind, params=params, params_hash=params_hash, data_version=version,
+                  created_by=user_id)
+        db.session.add(job)
+        db.session.commit()
+    return job
+
+
+def claim_next():
+    """Mark the oldest runnable job as running and return it, or None.
+
+    The claim is a conditional UPDATE, so when several workers race for
+    the same job exactly one of them sees its row change.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=app.config['JOB_TIMEOUT'])
+    runnable = or_(Job.status == 'queued',
+                   and_(Job.status == 'running', Job.started_date < stale,
+                        Job.attempts < app.config['JOB_MAX_ATTEMPTS']))
+    candidates = [job_id for job_id, in db.session.query(Job.id).filter(runnable).order_by(Job.id).limit(10)]
+    for job_id in candidates:
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, runnable)
+            .values(status='running', started_date=now, attempts=Job.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(job):
+    job_id = job.id
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            # The web profiles' statement timeout is too short for a full export
+            db.session.execute(text(f"SET LOCAL statement_timeout = {app.config['JOB_TIMEOUT'] * 1000}"))
+        # Read before the job runs, so the result is at least this fresh
+        version = data_version(job.kind)
+        body, mimetype, filename = JOB_KINDS[job.kind][1](json.loads(job.params))
+        job.result, job.mimetype, job.filename = body, mimetype, filename
+        job.data_version = version
+        job.status = 'done'
+        job.error = None
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_date = datetime.utcnow()
+    db.session.commit()
+
+    if job.status == 'done':
+        # The owner's older results for the same parameters are out of date
+        db.session.execute(delete(Job).where(Job.params_hash == job.params_hash, Job.id < job_id,
+                                             Job.created_by.is_not_distinct_from(job.created_by),
+                                             Job.status.in_(('done', 'failed'))))
+        db.session.commit()
+    return job
+
+
+def expire_jobs():
+    """Fail jobs out of attempts and delete results past JOB_RESULT_DAYS."""
+    now = datetime.utcnow()
+    db.session.execute(
+        update(Job).where(Job.status == 'running',
+                          Job.started_date < now - timedelta(seconds=app.config['JOB_TIMEOUT']),
+                          Job.attempts >= app.config['JOB_MAX_ATTEMPTS'])
+        .values(status='failed', error='Timed out', finished_date=now))
+    db.session.execute(delete(Job).where(
+        Job.finished_date < now - timedelta(days=app.config['JOB_RESULT_DAYS'])))
+    db.session.commit()
+
+
+@app.cli.command('run-worker')
+@click.option('--once', is_flag=True, help='Run the queued jobs, then exit.')
+def run_worker(once):
+    """Run queued reports and exports."""
+    print(f"Worker {os.getpid()} polling every {app.config['JOB_POLL_SECONDS']}s")
+    while True:
+        job = claim_next()
+        if job is not None:
+            started = time.perf_counter()
+            job = run_job(job)
+            print(f"Job {job.id} ({job.kind}) {job.status} in {time.perf_counter() - started:.1f}s"
+                  + (f': {job.error}' if job.error else ''))
+            db.session.remove()
+            continue
+        expire_jobs()
+        if once:
+            break
+        time.sleep(app.config['JOB_POLL_SECONDS'])
@@ -0,0 +1,129 @@
+from app import app, db
+from models import Booking, Revenue
+from settings_cache import usd_to_lrd_rate, to_decimal, CENTS
+import dashboard_stats
+from sqlalchemy import update, case, func, literal, Numeric
+from decimal import Decimal
+import click
+
+# Bookings checked per batch by the reconcile command
+RECONCILE_BATCH_SIZE = 1000
+
+
+def payment_status_expression(paid_usd, paid_lrd, rate):
+    """SQL for a booking's payment status given what has been paid so far.
+
+    LRD counts at ``rate``. Compared as USD * rate + LRD against the fee in
+    LRD, so no division happens in SQL (SQLite would truncate it).
+    """
+    rate = literal(rate, Numeric(12, 4))
+    paid_in_lrd = paid_usd * rate + paid_lrd
+    return case(
+        (paid_in_lrd >= Booking.total_fee_usd * rate, 'complete'),
+        (paid_in_lrd > 0, 'partial'),
+        else_='pending'
+    )
+
+
+def balance_due_usd(total_fee_usd, paid_usd, paid_lrd, rate=None):
+    """What is still owed on a booking, in USD.
+
+    LRD payments count at ``rate`` (default: the current one), the same way
+    payment_status_expression() decides that a booking is paid.
+    """
+    rate = rate or usd_to_lrd_rate()
+    owed_in_lrd = (to_decimal(total_fee_usd) - to_decimal(paid_usd)) * rate - to_decimal(paid_lrd)
+    return max(owed_in_lrd / rate, Decimal(0)).quantize(CENTS)
+
+
+def apply_payment(booking_id, amount_usd=0, amount_lrd=0):
+    """Add a payment to the booking's running totals in the current transaction.
+
+    The totals are bumped with a single UPDATE ... SET paid = paid + amount
+    on a locked row, so concurrent cashiers can't overwrite each other, and
+    the caller commits it together with the Revenue insert.
+    """
+    old_status = db.session.query(Booking.payment_status).filter(
+        Booking.id == booking_id).with_for_update().scalar()
+    if old_status is None:
+        raise ValueError(f'Booking {booking_id} not found')
+
+    paid_usd = func.coalesce(Booking.advance_paid_usd, 0) + amount_usd
+    paid_lrd = func.coalesce(Booking.advance_paid_lrd, 0) + amount_lrd
+    db.session.execute(
+        update(Booking).where(Booking.id == booking_id).values(
+            advance_paid_usd=paid_usd,
+            advance_paid_lrd=paid_lrd,
+            payment_status=payment_status_expression(paid_usd, paid_lrd, usd_to_lrd_rate())
+        ).execution_options(synchronize_session=False)
+    )
+
+    new_status = db.session.query(Booking.payment_status).filter(Booking.id == booking_id).scalar()
+    # Core UPDATEs skip the flush listener, so keep the dashboard in step here
+    if (old_status == 'pending') != (new_status == 'pending'):
+        dashboard_stats.apply_deltas(db.session.connection(),
+                                     {'pending_bookings': 1 if new_status == 'pending' else -1})
+    return new_status
+
+
+def record_payment(revenue):
+    """Insert a Revenue row and post it to its booking, in one transaction."""
+    db.session.add(revenue)
+    return apply_payment(revenue.booking_id, revenue.amount_usd or 0, revenue.amount_lrd or 0)
+
+
+def ledger_mismatches():
+    """Yield (booking_id, stored_usd, stored_lrd, actual_usd, actual_lrd) that disagree."""
+    paid = db.session.query(
+        Revenue.booking_id.label('booking_id'),
+        func.sum(Revenue.amount_usd).label('usd'),
+        func.sum(Revenue.amount_lrd).label('lrd')
+    ).group_by(Revenue.booking_id).subquery()
+
+    actual_usd = func.coalesce(paid.c.usd, 0)
+    actual_lrd = func.coalesce(paid.c.lrd, 0)
+    rows = db.session.query(
+        Booking.id, Booking.advance_paid_usd, Booking.advance_paid_lrd, actual_usd, actual_lrd
+    ).outerjoin(paid, paid.c.booking_id == Booking.id).filter(
+        (func.coalesce(Booking.advance_paid_usd, 0) != actual_usd)
+        | (func.coalesce(Booking.advance_paid_lrd, 0) != actual_lrd)
+    ).order_by(Booking.id).yield_per(RECONCILE_BATCH_SIZE)
+
+    for row in rows:
+        yield tuple(row)
+
+
+def fix_booking_totals(booking_ids):
+    """Reset the paid totals and status of the given bookings from their revenue rows."""
+    paid_usd = func.coalesce(db.session.query(func.sum(Revenue.amount_usd)).filter(
+        Revenue.booking_id == Booking.id).scalar_subquery(), 0)
+    paid_lrd = func.coalesce(db.session.query(func.sum(Revenue.amount_lrd)).filter(
+        Revenue.booking_id == Booking.id).scalar_subquery(), 0)
+    db.session.execute(
+        update(Booking).where(Booking.id.in_(booking_ids)).values(
+            advance_paid_usd=paid_usd,
+            advance_paid_lrd=paid_lrd,
+            payment_status=payment_status_expression(paid_usd, paid_lrd, usd_to_lrd_rate())
+        ).execution_options(synchronize_session=False)
+    )
+
+
+@app.cli.command('reconcile-ledger')
+@click.option('--fix', is_flag=True, help='Rewrite the totals that disagree.')
+def reconcile_ledger_command(fix):
+    """Check every booking's paid totals against the revenue table."""
+    mismatched = []
+    for booking_id, stored_usd, stored_lrd, actual_usd, actual_lrd in ledger_mismatches():
+        print(f"booking {booking_id}: stored USD {stored_usd} LRD {stored_lrd}, "
+              f"revenue USD {actual_usd} LRD {actual_lrd}")
+        mismatched.append(booking_id)
+
+    if fix and mismatched:
+        for start in range(0, len(mismatched), RECONCILE_BATCH_SIZE):
+            fix_booking_totals(mismatched[start:start + RECONCILE_BATCH_SIZE])
+        db.session.commit()
+        # Payment statuses may have moved, so the pending counter may have too
+        dashboard_stats.reconcile_dashboard_stats()
+        print(f"Fixed {len(mismatched)} bookings")
+    else:
+        print(f"{len(mismatched)} bookings out of balance")
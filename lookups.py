@@ -0,0 +1,66 @@
+from app import db
+from models import Booking, Facility, Customer
+from pagination import keyset_paginate
+from availability import is_active
+from ledger import balance_due_usd
+from settings_cache import usd_to_lrd_rate
+from datetime import date, timedelta
+
+# Options returned per lookup page
+LOOKUP_PAGE_SIZE = 25
+# Without a customer or explicit dates, bookings are offered from this window
+DEFAULT_WINDOW = (timedelta(days=90), timedelta(days=365))
+
+PAYMENT_STATUSES = ('pending', 'partial', 'complete')
+
+
+def booking_options(customer_id=None, facility_id=None, start_date=None, end_date=None,
+                    statuses=None, cursor=None, per_page=LOOKUP_PAGE_SIZE):
+    """A page of id/label options for a booking picker.
+
+    Only the columns needed for the label are read, and only within a date
+    window or for one customer, so the form never pulls the bookings table.
+    """
+    if customer_id is None and start_date is None and end_date is None:
+        today = date.today()
+        start_date, end_date = today - DEFAULT_WINDOW[0], today + DEFAULT_WINDOW[1]
+
+    query = db.session.query(
+        Booking.id, Booking.booking_date, Booking.total_fee_usd,
+        Booking.advance_paid_usd, Booking.advance_paid_lrd, Booking.payment_status,
+        Facility.name.label('facility'), Customer.name.label('customer')
+    ).select_from(Booking).join(Facility).join(Customer).filter(is_active())
+
+    if customer_id is not None:
+        query = query.filter(Booking.customer_id == customer_id)
+    if facility_id is not None:
+        query = query.filter(Booking.facility_id == facility_id)
+    if start_date is not None:
+        query = query.filter(Booking.booking_date >= start_date)
+    if end_date is not None:
+        query = query.filter(Booking.booking_date <= end_date)
+    if statuses:
+        query = query.filter(Booking.payment_status.in_(statuses))
+
+    page = keyset_paginate(query, [Booking.booking_date, Booking.id], descending=True,
+                           cursor=cursor, per_page=per_page)
+    rate = usd_to_lrd_rate()
+    return {
+        'results': [{'id': row.id, 'label': _booking_label(row, rate)} for row in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+
+def _booking_label(row, rate):
+    label = f'#{row.id} - {row.booking_date:%Y-%m-%d} - {row.facility} - {row.customer}'
+    if row.payment_status != 'complete':
+        balance = balance_due_usd(row.total_fee_usd, row.advance_paid_usd, row.advance_paid_lrd, rate)
+        label += f' (balance ${balance:,.2f})'
+    return label
+
+
+def facility_options():
+    rows = db.session.query(Facility.id, Facility.name, Facility.usd_fee).filter(
+        Facility.status == 'active').order_by(Facility.name).all()
+    return [{'id': row.id, 'label': row.name, 'usd_fee': str(row.usd_fee)} for row in rows]
@@ -0,0 +1,294 @@
+from app import app, db
+from models import (User, Booking, Revenue, Expense, Customer, CashManagement, SchemaMigration,
+                    TableVersion, FinancialDaily, Job, ACTIVE_BOOKING_CONDITION)
+from financial_rollup import rebuild_rollup
+from dashboard_stats import store_dashboard_stats
+from seed import seed_defaults
+from sqlalchemy import func, inspect, text, select
+from sqlalchemy.schema import CreateIndex
+from datetime import date, timedelta
+import click
+import re
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+def _create_index_concurrently(connection, index):
+    # A CONCURRENTLY build that failed (e.g. on a duplicate) leaves an
+    # invalid index behind, which IF NOT EXISTS would then skip
+    invalid = connection.execute(text(
+        'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'WHERE c.relname = :name AND NOT i.indisvalid'), {'name': index.name}).first()
+    if invalid:
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=connection.dialect))
+    connection.execute(text(re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl)))
+
+
+def create_indexes(*indexes, dialect=None):
+    """A migration step that creates model-declared indexes that are missing.
+
+    Indexes a fresh database already got from create_all() are skipped
+    (CREATE INDEX IF NOT EXISTS), so every database ends up with the same
+    set whichever way it was built. On PostgreSQL they are built
+    CONCURRENTLY, so writes to the table carry on during the build.
+    """
+    def step(connection):
+        if dialect and connection.dialect.name != dialect:
+            return
+        for model, name in indexes:
+            if connection.dialect.name == 'postgresql':
+                _create_index_concurrently(connection, _index(model, name))
+            else:
+                connection.execute(CreateIndex(_index(model, name), if_not_exists=True))
+    step.concurrent = True
+    return step
+
+
+def create_missing_tables(connection):
+    db.metadata.create_all(connection, checkfirst=True)
+
+
+def create_tables(*models):
+    def step(connection):
+        for model in models:
+            model.__table__.create(connection, checkfirst=True)
+    return step
+
+
+def check_duplicate_bookings(connection):
+    # The unique active-booking index can't be built while a facility is
+    # double-booked; list the clashes so they can be cancelled or moved first.
+    clashes = connection.execute(
+        select(Booking.facility_id, Booking.booking_date, func.count())
+        .where(text(ACTIVE_BOOKING_CONDITION))
+        .group_by(Booking.facility_id, Booking.booking_date)
+        .having(func.count() > 1)
+    ).all()
+    if clashes:
+        lines = '\n'.join(f'  facility {facility_id} on {booking_date}: {count} active bookings'
+                          for facility_id, booking_date, count in clashes)
+        raise MigrationError('Resolve these double bookings before migrating:\n' + lines)
+
+
+def enable_trigram(connection):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
+
+def _steps(*steps):
+    def migration(connection):
+        for step in steps:
+            step(connection)
+    migration.concurrent = any(getattr(step, 'concurrent', False) for step in steps)
+    return migration
+
+
+# (version, description, function(connection)); append only, never reorder
+MIGRATIONS = [
+    ('0001', 'Create missing tables', create_missing_tables),
+    ('0002', 'Booking date and status indexes', create_indexes(
+        (Booking, 'ix_bookings_facility_date'),
+        (Booking, 'ix_bookings_date_id'),
+        (Booking, 'ix_bookings_customer_date'),
+        (Booking, 'ix_bookings_payment_status'),
+    )),
+    ('0003', 'One active booking per facility per day', _steps(
+        check_duplicate_bookings,
+        create_indexes((Booking, 'uq_bookings_facility_date_active')),
+    )),
+    ('0004', 'Revenue and expense indexes', create_indexes(
+        (Revenue, 'ix_revenue_payment_date_id'),
+        (Revenue, 'ix_revenue_booking_id'),
+        (Expense, 'ix_expenses_expense_date_id'),
+        (CashManagement, 'ix_cash_management_date'),
+    )),
+    ('0005', 'Customer search indexes', _steps(
+        enable_trigram,
+        create_indexes(
+            (Customer, 'ix_customers_name_lower'),
+            (Customer, 'ix_customers_email_lower'),
+            (Customer, 'ix_customers_phone'),
+        ),
+        create_indexes((Customer, 'ix_customers_name_trgm'), dialect='postgresql'),
+    )),
+    ('0006', 'Table write versions for the response cache', create_tables(TableVersion)),
+    ('0007', 'Daily revenue/expense rollup, backfilled', _steps(
+        create_tables(FinancialDaily),
+        rebuild_rollup,
+    )),
+    ('0008', 'Background job queue', create_tables(Job)),
+    # Stored once here so the dashboard never has to write them on a GET
+    ('0009', 'Dashboard counters', store_dashboard_stats),
+]
+
+
+def applied_versions():
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    return {version for (version,) in db.session.query(SchemaMigration.version)}
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def _record(connection, version, description):
+    connection.execute(SchemaMigration.__table__.insert().values(
+        version=version, description=description, applied_date=func.now()))
+
+
+def apply_migrations(echo=None):
+    """Apply every pending migration, each in its own transaction.
+
+    Migrations only add tables and indexes, never drop or rewrite data, so
+    they are safe to run against a live database on every deploy. On
+    PostgreSQL, migrations that build indexes run outside a transaction
+    (CREATE INDEX CONCURRENTLY can't run inside one) and don't block
+    writes; one that fails part-way is simply run again next time. SQLite
+    builds them inside the transaction, locking the file for the build.
+    """
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = []
+    for version, description, migrate in pending_migrations():
+        if echo:
+            echo(f'Applying {version}: {description}')
+        if db.engine.dialect.name == 'postgresql' and getattr(migrate, 'concurrent', False):
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                # Index builds on big tables may outlast the request timeout
+                connection.execute(text('SET statement_timeout = 0'))
+                try:
+                    migrate(connection)
+                    _record(connection, version, description)
+                finally:
+                    connection.execute(text('RESET statement_timeout'))
+        else:
+            with db.engine.begin() as connection:
+                if connection.dialect.name == 'postgresql':
+                    connection.execute(text('SET LOCAL statement_timeout = 0'))
+                migrate(connection)
+                _record(connection, version, description)
+        applied.append(version)
+    # Pooled connections may still hold plans prepared against the old schema
+    db.session.remove()
+    db.engine.dispose()
+    return applied
+
+
+def _sample_ids():
+    # Real ids and dates make the plans representative of the actual data
+    booking = db.session.query(Booking.id, Booking.facility_id, Booking.customer_id).order_by(
+        Booking.id.desc()).first()
+    return booking or (1, 1, 1)
+
+
+def hot_queries():
+    """The queries behind the busiest pages, as ``{name: query}``."""
+    booking_id, facility_id, customer_id = _sample_ids()
+    today = date.today()
+    month = (today.replace(day=1), today.replace(day=1) + timedelta(days=30))
+    return {
+        'bookings list page': Booking.query.order_by(
+            Booking.booking_date.desc(), Booking.id.desc()).limit(21),
+        'facility calendar month': db.session.query(Booking.facility_id, Booking.booking_date).filter(
+            Booking.facility_id.in_([facility_id]), Booking.booking_date.between(*month),
+            func.coalesce(Booking.booking_status, 'pending') != 'cancelled'),
+        'customer bookings': db.session.query(Booking.id).filter(
+            Booking.customer_id == customer_id).order_by(Booking.booking_date.desc()),
+        'pending payments': db.session.query(func.count(Booking.id)).filter(
+            Booking.payment_status == 'pending'),
+        'revenue list page': Revenue.query.order_by(
+            Revenue.payment_date.desc(), Revenue.id.desc()).limit(21),
+        'revenue report range': db.session.query(func.sum(Revenue.amount_usd)).filter(
+            Revenue.payment_date.between(*month)),
+        'booking paid totals': db.session.query(
+            func.sum(Revenue.amount_usd), func.sum(Revenue.amount_lrd)).filter(
+            Revenue.booking_id == booking_id),
+        'expenses list page': Expense.query.order_by(
+            Expense.expense_date.desc(), Expense.id.desc()).limit(21),
+        'expense report range': db.session.query(func.sum(Expense.amount_usd)).filter(
+            Expense.expense_date.between(*month)),
+    }
+
+
+def explain(query):
+    """The database's plan for ``query`` as a list of lines."""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + sql)).all()
+    return [str(row[-1]) for row in rows]
+
+
+def is_full_scan(plan):
+    for line in plan:
+        if 'Seq Scan' in line:
+            return True
+        # SQLite: 'SCAN bookings' is a table scan, 'SCAN bookings USING INDEX' is not
+        if line.startswith('SCAN ') and 'USING' not in line:
+            return True
+    return False
+
+
+def explain_hot_queries():
+    return {name: explain(query) for name, query in hot_queries().items()}
+
+
+def print_plans(plans):
+    for name, plan in plans.items():
+        flag = '  FULL SCAN' if is_full_scan(plan) else ''
+        print(f'{name}:{flag}')
+        for line in plan:
+            print(f'    {line}')
+
+
+@app.cli.command('migrate')
+@click.option('--explain', 'show_plans', is_flag=True,
+              help='Print the hot query plans before and after migrating.')
+def migrate_command(show_plans):
+    """Apply pending schema migrations; a new database also gets the default data."""
+    # A brand-new database has no tables to explain yet
+    has_tables = inspect(db.engine).has_table(Booking.__tablename__)
+    before = explain_hot_queries() if show_plans and has_tables else {}
+    applied = apply_migrations(echo=print)
+    print(f'Applied {len(applied)} migration(s)' if applied else 'Schema is up to date')
+    if not User.query.first():
+        seed_defaults()
+        print('Created the default admin user, facilities, events and settings')
+
+    if show_plans:
+        after = explain_hot_queries()
+        for name in after:
+            if before.get(name) != after[name]:
+                print(f'{name}:')
+                print('  before: ' + ' / '.join(before.get(name, ['(no table)'])))
+                print('  after:  ' + ' / '.join(after[name]))
+        scans = [name for name, plan in after.items() if is_full_scan(plan)]
+        if scans:
+            print('Still scanning the whole table: ' + ', '.join(scans))
+
+
+@app.cli.command('migrate-status')
+def migrate_status_command():
+    """List schema migrations and whether each is applied."""
+    applied = applied_versions()
+    for version, description, _ in MIGRATIONS:
+        print(f"{version} [{'x' if version in applied else ' '}] {description}")
+
+
+@app.cli.command('explain-hot-queries')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if any query scans a whole table.')
+def explain_hot_queries_command(strict):
+    """Print the plans of the busiest queries, flagging full table scans."""
+    plans = explain_hot_queries()
+    print_plans(plans)
+    # PostgreSQL rightly seq-scans tiny tables, so only fail when asked to
+    if strict and any(is_full_scan(plan) for plan in plans.values()):
+        raise SystemExit(1)
@@ -58,8 +58,33 @@ class Customer(db.Model):
     # Relationships
     bookings = db.relationship('Booking', backref='customer', lazy=True)
 
+# Customer search (see customer_search.py): case-insensitive prefix indexes on
+# name, phone and email, plus a trigram index on name on PostgreSQL
+db.Index('ix_customers_name_lower', db.func.lower(Customer.name).label('name_lower'),
+         postgresql_ops={'name_lower': 'text_pattern_ops'})
+db.Index('ix_customers_email_lower', db.func.lower(Customer.email).label('email_lower'),
+         postgresql_ops={'email_lower': 'text_pattern_ops'})
+db.Index('ix_customers_phone', Customer.phone, postgresql_ops={'phone': 'text_pattern_ops'})
+db.Index('ix_customers_name_trgm', Customer.name, postgresql_using='gin',
+         postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+db.event.listen(Customer.__table__, 'before_create',
+                db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# Bookings that hold their facility for the day; cancelled ones free it up
+ACTIVE_BOOKING_CONDITION = "COALESCE(booking_status, 'pending') <> 'cancelled'"
+
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_facility_date', 'facility_id', 'booking_date'),
+        db.Index('ix_bookings_date_id', 'booking_date', 'id'),
+        db.Index('ix_bookings_customer_date', 'customer_id', 'booking_date'),
+        db.Index('ix_bookings_payment_status', 'payment_status', 'booking_date'),
+        # At most one active booking per facility per day
+        db.Index('uq_bookings_facility_date_active', 'facility_id', 'booking_date', unique=True,
+                 postgresql_where=db.text(ACTIVE_BOOKING_CONDITION),
+                 sqlite_where=db.text(ACTIVE_BOOKING_CONDITION)),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
@@ -82,10 +107,17 @@ class Booking(db.Model):
     
     @property
     def balance_due_usd(self):
-        return float(self.total_fee_usd) - float(self.advance_paid_usd)
+        from ledger import balance_due_usd  # ledger imports this module
+        return balance_due_usd(self.total_fee_usd, self.advance_paid_usd, self.advance_paid_lrd)
 
 class Revenue(db.Model):
     __tablename__ = 'revenue'
+    __table_args__ = (
+        db.Index('ix_revenue_payment_date_id', 'payment_date', 'id'),
+        # Covers the per-booking paid totals on PostgreSQL (see ledger.py)
+        db.Index('ix_revenue_booking_id', 'booking_id',
+                 postgresql_include=['amount_usd', 'amount_lrd']),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=False)
@@ -102,6 +134,9 @@ class Revenue(db.Model):
 
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        db.Index('ix_expenses_expense_date_id', 'expense_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'))
@@ -118,6 +153,11 @@ class Expense(db.Model):
     receipt_number = db.Column(db.String(50))
     recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    facility = db.relationship('Facility', lazy=True)
+    event = db.relationship('Event', lazy=True)
+    customer = db.relationship('Customer', lazy=True)
 
 class SystemSetting(db.Model):
     __tablename__ = 'system_settings'
@@ -131,6 +171,9 @@ class SystemSetting(db.Model):
 
 class CashManagement(db.Model):
     __tablename__ = 'cash_management'
+    __table_args__ = (
+        db.Index('ix_cash_management_date', 'transaction_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     transaction_date = db.Column(db.Date, nullable=False)
@@ -146,3 +189,82 @@ class CashManagement(db.Model):
     reference_id = db.Column(db.Integer)
     recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DashboardStat(db.Model):
+    __tablename__ = 'dashboard_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    stat_key = db.Column(db.String(50), unique=True, nullable=False)  # e.g. total_bookings, revenue_usd:2024-05
+    value = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CashBalanceCheckpoint(db.Model):
+    __tablename__ = 'cash_balance_checkpoints'
+    __table_args__ = (
+        db.UniqueConstraint('location', 'currency_type', 'as_of_date', name='uq_cash_checkpoint'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(20), nullable=False)  # vault, bank
+    currency_type = db.Column(db.String(3), nullable=False)
+    as_of_date = db.Column(db.Date, nullable=False)  # balance at the end of this day
+    balance = db.Column(db.Numeric(15, 2), nullable=False)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.String(20), primary_key=True)  # see migrations.py
+    description = db.Column(db.String(200), nullable=False)
+    applied_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)  # bumped by every committed write, see response_cache.py
+
+class FinancialDaily(db.Model):
+    __tablename__ = 'financial_daily'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'kind', 'facility_id', 'event_id', 'customer_id', 'currency_type',
+                            name='uq_financial_daily'),
+    )
+    
+    # Revenue and expense totals per day, kept by financial_rollup.py. Ids
+    # are 0 rather than NULL for expenses not tied to a facility, event or
+    # customer, so the unique key (and ON CONFLICT) matches them.
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # revenue, expense
+    facility_id = db.Column(db.Integer, nullable=False, default=0)
+    event_id = db.Column(db.Integer, nullable=False, default=0)
+    customer_id = db.Column(db.Integer, nullable=False, default=0)
+    currency_type = db.Column(db.String(3), nullable=False)
+    amount_usd = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    amount_lrd = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+        db.Index('ix_jobs_params_hash', 'params_hash', 'data_version'),
+    )
+    
+    # Background reports and exports, run by `flask run-worker` (see jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # export, report
+    params = db.Column(db.Text, nullable=False)  # JSON
+    params_hash = db.Column(db.String(40), nullable=False)
+    data_version = db.Column(db.String(200), nullable=False)  # table versions the result was built from
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.LargeBinary)
+    mimetype = db.Column(db.String(50))
+    filename = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    started_date = db.Column(db.DateTime)
+    finished_date = db.Column(db.DateTime)
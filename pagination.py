@@ -0,0 +1,122 @@
+from sqlalchemy import and_, or_
+import base64
+import json
+from datetime import date, datetime
+
+
+class KeysetPage:
+    """One page of a keyset (seek) paginated query.
+
+    Exposes ``items`` like Flask-SQLAlchemy's Pagination, plus opaque
+    ``next_cursor``/``prev_cursor`` tokens. ``total`` is only computed when
+    asked for, since it costs a full COUNT(*).
+    """
+
+    def __init__(self, items, next_cursor, prev_cursor, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values, direction):
+    payload = [direction] + [_dump_value(v) for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Return ``(direction, values)`` or ``(None, None)`` for a bad cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or not payload:
+            return None, None
+        direction, values = payload[0], payload[1:]
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            return None, None
+        return direction, [_load_value(v, col) for v, col in zip(values, columns)]
+    except (ValueError, TypeError, IndexError, ArithmeticError):
+        return None, None
+
+
+def _dump_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _load_value(value, column):
+    # Cursors come back from the client, so every value is checked against
+    # its column's type before it gets near the query
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if value is None or isinstance(value, (bool, list, dict)):
+        raise TypeError(f'bad cursor value for {column.key}')
+    return python_type(value)
+
+
+def _seek_condition(columns, values, descending):
+    # (a, b) after (x, y) expanded to "a > x OR (a = x AND b > y)" so it works
+    # on every backend, including SQLite without row-value support.
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, descending=False, cursor=None, per_page=20, with_total=False):
+    """Paginate ``query`` by seeking past the sort key of the last row seen.
+
+    ``columns`` is the sort key, ending with a unique tiebreaker (normally
+    the primary key). Every page costs one indexed range scan, so page 500
+    is as cheap as page 1.
+    """
+    total = query.order_by(None).count() if with_total else None
+
+    direction, values = (None, None)
+    if cursor:
+        direction, values = decode_cursor(cursor, columns)
+
+    # Walking backwards reads the index in the opposite order, then flips
+    # the page so rows always come out in display order.
+    backwards = direction == 'prev'
+    reverse = descending != backwards
+    if values is not None:
+        query = query.filter(_seek_condition(columns, values, reverse))
+    order = [c.desc() if reverse else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def key_of(row):
+        return [_key_value(row, c) for c in columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = encode_cursor(key_of(rows[-1]), 'next')
+        if values is not None and (has_more or not backwards):
+            prev_cursor = encode_cursor(key_of(rows[0]), 'prev')
+
+    return KeysetPage(rows, next_cursor, prev_cursor, total)
+
+
+def _key_value(row, column):
+    return getattr(row, column.key)
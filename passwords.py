@@ -0,0 +1,131 @@
+from app import app, bcrypt
+from instrumentation import timed
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import bcrypt as _bcrypt
+import click
+import os
+import threading
+import time
+
+# bcrypt hashes at most this many passwords at once per worker process; the
+# C extension releases the GIL, so other request threads keep running.
+app.config.setdefault('BCRYPT_MAX_CONCURRENCY', int(os.environ.get('BCRYPT_MAX_CONCURRENCY', 2)))
+# How long a login waits for a hashing slot before giving up
+app.config.setdefault('PASSWORD_VERIFY_TIMEOUT', float(os.environ.get('PASSWORD_VERIFY_TIMEOUT', 5)))
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_VERIFY_TIMEOUT."""
+
+
+_lock = threading.Lock()
+_pool = {'executor': None, 'slots': None, 'pid': None}
+
+
+def _executor():
+    # Created lazily, and again after a fork, so preloaded gunicorn workers
+    # each get their own threads.
+    with _lock:
+        if _pool['pid'] != os.getpid():
+            size = app.config['BCRYPT_MAX_CONCURRENCY']
+            _pool['executor'] = ThreadPoolExecutor(max_workers=size, thread_name_prefix='bcrypt')
+            # Running plus queued work is capped at twice the pool size
+            _pool['slots'] = threading.BoundedSemaphore(size * 2)
+            _pool['pid'] = os.getpid()
+        return _pool['executor'], _pool['slots']
+
+
+def _run(fn, *args):
+    # Timed including the wait for a slot, which is what the login feels
+    with timed('bcrypt'):
+        return _run_in_pool(fn, *args)
+
+
+def _run_in_pool(fn, *args):
+    executor, slots = _executor()
+    timeout = app.config['PASSWORD_VERIFY_TIMEOUT']
+    deadline = time.monotonic() + timeout
+    if not slots.acquire(timeout=timeout):
+        raise PasswordServiceBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the hash finishes or is cancelled, not just until
+    # this caller stops waiting, so abandoned work still counts against the cap
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FutureTimeout:
+        # Drops it if still queued; a hash already running can't be stopped
+        future.cancel()
+        raise PasswordServiceBusy()
+
+
+def verify_password(password_hash, password):
+    return _run(bcrypt.check_password_hash, password_hash, password)
+
+
+def hash_password(password):
+    return _run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+
+def hash_rounds(password_hash):
+    """The work factor encoded in a bcrypt hash ('$2b$12$...' -> 12)."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_rounds(password_hash) != app.config['BCRYPT_LOG_ROUNDS']
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@app.cli.command('bench-login')
+@click.option('--rounds', multiple=True, type=int, help='Work factors to try (repeatable).')
+@click.option('--logins', default=100, show_default=True, help='Logins per work factor.')
+@click.option('--concurrency', default=8, show_default=True, help='Simultaneous login attempts.')
+def bench_login_command(rounds, logins, concurrency):
+    """Measure login verification latency under concurrent load.
+
+    Drives verify_password() through the bounded pool exactly as login()
+    does, so the numbers include queueing for a hashing slot.
+    """
+    rounds = rounds or (app.config['BCRYPT_LOG_ROUNDS'],)
+    print(f"pool size {app.config['BCRYPT_MAX_CONCURRENCY']}, "
+          f"{concurrency} concurrent clients, {logins} logins per cost")
+
+    for cost in rounds:
+        password_hash = _bcrypt.hashpw(b'benchmark-password', _bcrypt.gensalt(cost)).decode('utf-8')
+        latencies = []
+        failures = []
+
+        def login_once(_):
+            started = time.perf_counter()
+            try:
+                verify_password(password_hash, 'benchmark-password')
+                latencies.append(time.perf_counter() - started)
+            except PasswordServiceBusy:
+                failures.append(1)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            list(clients.map(login_once, range(logins)))
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            print(f"cost {cost}: every login timed out")
+            continue
+        print(f"cost {cost}: {len(latencies) / elapsed:.1f} logins/s  "
+              f"p50 {_percentile(latencies, 50) * 1000:.0f}ms  "
+              f"p95 {_percentile(latencies, 95) * 1000:.0f}ms  "
+              f"p99 {_percentile(latencies, 99) * 1000:.0f}ms  "
+              f"busy {len(failures)}")
@@ -0,0 +1,77 @@
+from app import app, db
+from models import User
+from flask import g, session
+from commit_hooks import on_commit_invalidate
+from sqlalchemy.orm.attributes import get_history
+from collections import namedtuple
+import threading
+import time
+
+# Seconds a worker may reuse a user's role/active flag before re-reading it.
+# This bounds how long a deactivated or demoted user keeps their access on
+# workers that didn't make the change themselves.
+app.config.setdefault('PRINCIPAL_CACHE_TTL', 30)
+
+Principal = namedtuple('Principal', 'id username role full_name is_active')
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def load_principal(user_id):
+    """The user's identity and role, from the worker cache or the database."""
+    now = time.monotonic()
+    cached = _cache.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    row = db.session.query(
+        User.id, User.username, User.role, User.full_name, User.is_active
+    ).filter(User.id == user_id).first()
+    principal = Principal(*row) if row else None
+
+    with _lock:
+        _cache[user_id] = (principal, now + app.config['PRINCIPAL_CACHE_TTL'])
+    return principal
+
+
+def current_principal():
+    """The signed-in user for this request, resolved at most once."""
+    if 'principal' not in g:
+        user_id = session.get('user_id')
+        principal = load_principal(user_id) if user_id is not None else None
+        g.principal = principal if principal and principal.is_active else None
+    return g.principal
+
+
+def has_role(*roles):
+    principal = current_principal()
+    return principal is not None and principal.role in roles
+
+
+def invalidate_user(user_id):
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+@app.context_processor
+def inject_principal():
+    return {'current_principal': current_principal, 'has_role': has_role}
+
+
+# Forget cached principals as soon as this worker commits a change to a
+# user's role or active flag.
+def _access_changed(session, obj):
+    if isinstance(obj, User) and (obj in session.deleted
+                                  or get_history(obj, 'role').has_changes()
+                                  or get_history(obj, 'is_active').has_changes()):
+        return obj.id
+    return None
+
+
+def _invalidate_users(user_ids):
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+on_commit_invalidate(_access_changed, _invalidate_users)
@@ -0,0 +1,181 @@
+from app import db
+from models import Revenue, Expense, Booking, Facility, Event, Customer, FinancialDaily
+from pagination import keyset_paginate
+from sqlalchemy import func
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+# Group filter value for rows without a facility, event or customer
+# (expenses not tied to a booking); an absent filter means "any"
+UNASSIGNED = 'none'
+
+# One line of a grouped report. ``level`` is 'customer' for a leaf group,
+# 'event' and 'facility' for subtotals and 'total' for the grand total, the
+# same shape GROUP BY ROLLUP(facility, event, customer) produces.
+ReportRow = namedtuple('ReportRow', 'level facility_id facility event_id event customer_id customer '
+                                   'amount_usd amount_lrd entries')
+
+
+def report_date_range(args, default_days=30):
+    """Parse ``start_date``/``end_date`` query arguments, defaulting to the last 30 days."""
+    today = date.today()
+    start_date = _parse_date(args.get('start_date')) or today - timedelta(days=default_days)
+    end_date = _parse_date(args.get('end_date')) or today
+    return start_date, end_date
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _rollup_groups(kind, start_date, end_date):
+    # Ids are stored as 0 for "none" (see FinancialDaily); NULLIF turns them back
+    facility_id, event_id, customer_id = (func.nullif(FinancialDaily.facility_id, 0),
+                                          func.nullif(FinancialDaily.event_id, 0),
+                                          func.nullif(FinancialDaily.customer_id, 0))
+    return db.session.query(
+        facility_id, Facility.name, event_id, Event.name, customer_id, Customer.name,
+        func.coalesce(func.sum(FinancialDaily.amount_usd), 0),
+        func.coalesce(func.sum(FinancialDaily.amount_lrd), 0),
+        func.coalesce(func.sum(FinancialDaily.entries), 0)
+    ).select_from(FinancialDaily).outerjoin(
+        Facility, Facility.id == FinancialDaily.facility_id).outerjoin(
+        Event, Event.id == FinancialDaily.event_id).outerjoin(
+        Customer, Customer.id == FinancialDaily.customer_id).filter(
+        FinancialDaily.kind == kind,
+        FinancialDaily.day.between(start_date, end_date),
+        # Rows whose entries were all deleted stay behind at zero
+        FinancialDaily.entries != 0
+    ).group_by(
+        FinancialDaily.facility_id, Facility.name, FinancialDaily.event_id, Event.name,
+        FinancialDaily.customer_id, Customer.name
+    ).order_by(Facility.name, FinancialDaily.facility_id, Event.name, FinancialDaily.event_id,
+               Customer.name, FinancialDaily.customer_id).all()
+
+
+def revenue_groups(start_date, end_date):
+    """Revenue per facility/event/customer, from the daily rollup.
+
+    Reads one row per day and group instead of every payment, so multi-year
+    ranges stay cheap. Report ranges are whole days, so no raw rows are needed.
+    """
+    return _rollup_groups('revenue', start_date, end_date)
+
+
+def expense_groups(start_date, end_date):
+    """Expenses per facility/event/customer; unassigned expenses group under None."""
+    return _rollup_groups('expense', start_date, end_date)
+
+
+def rollup(groups):
+    """Interleave facility and facility/event subtotals plus a grand total.
+
+    Works over the already-aggregated groups, so it costs O(groups)
+    whatever the number of underlying payments.
+    """
+    rows = []
+    grand = [Decimal(0), Decimal(0), 0]
+
+    for facility, facility_groups in groupby(groups, key=lambda g: g[0:2]):
+        facility_total = [Decimal(0), Decimal(0), 0]
+        for event, event_groups in groupby(facility_groups, key=lambda g: g[2:4]):
+            event_total = [Decimal(0), Decimal(0), 0]
+            for group in event_groups:
+                customer, (usd, lrd, entries) = group[4:6], group[6:9]
+                rows.append(ReportRow('customer', *facility, *event, *customer, usd, lrd, entries))
+                _add(event_total, usd, lrd, entries)
+            rows.append(ReportRow('event', *facility, *event, None, None, *event_total))
+            _add(facility_total, *event_total)
+        rows.append(ReportRow('facility', *facility, None, None, None, None, *facility_total))
+        _add(grand, *facility_total)
+
+    rows.append(ReportRow('total', None, None, None, None, None, None, *grand))
+    return rows
+
+
+def _add(total, usd, lrd, entries):
+    total[0] += Decimal(str(usd or 0))
+    total[1] += Decimal(str(lrd or 0))
+    total[2] += entries
+
+
+def income_expense_summary(start_date, end_date):
+    revenue_rows = rollup(revenue_groups(start_date, end_date))
+    expense_rows = rollup(expense_groups(start_date, end_date))
+    revenue_total = revenue_rows[-1]
+    expense_total = expense_rows[-1]
+    return {
+        'revenue_rows': revenue_rows,
+        'expense_rows': expense_rows,
+        'net_usd': revenue_total.amount_usd - expense_total.amount_usd,
+        'net_lrd': revenue_total.amount_lrd - expense_total.amount_lrd,
+    }
+
+
+def group_filter(value):
+    """A facility/event/customer filter from the query string: an id,
+    UNASSIGNED, or None (no filter) for anything else."""
+    if value == UNASSIGNED:
+        return UNASSIGNED
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def filter_groups(query, model, facility_id=None, event_id=None, customer_id=None):
+    """Narrow ``query`` to one report group; UNASSIGNED matches a NULL id."""
+    for column, value in ((model.facility_id, facility_id), (model.event_id, event_id),
+                          (model.customer_id, customer_id)):
+        if value == UNASSIGNED:
+            query = query.filter(column.is_(None))
+        elif value is not None:
+            query = query.filter(column == value)
+    return query
+
+
+def revenue_rows(start_date, end_date, facility_id=None, event_id=None, customer_id=None):
+    """Id/label projection of the payments in a range, for drill-downs and exports."""
+    query = db.session.query(
+        Revenue.id, Revenue.payment_date, Revenue.booking_id,
+        Revenue.amount_usd, Revenue.amount_lrd, Revenue.currency_type,
+        Revenue.payment_method, Revenue.receipt_number,
+        Facility.name.label('facility'), Event.name.label('event'),
+        Customer.name.label('customer')
+    ).select_from(Revenue).join(Booking).join(Facility).join(Event).join(Customer).filter(
+        Revenue.payment_date.between(start_date, end_date)
+    )
+    return filter_groups(query, Booking, facility_id, event_id, customer_id)
+
+
+def expense_rows(start_date, end_date, facility_id=None, event_id=None, customer_id=None):
+    """Id/label projection of the expenses in a range, for drill-downs and exports."""
+    query = db.session.query(
+        Expense.id, Expense.expense_date, Expense.booking_id, Expense.category,
+        Expense.description, Expense.amount_usd, Expense.amount_lrd,
+        Expense.currency_type, Expense.payment_method, Expense.receipt_number,
+        Facility.name.label('facility'), Event.name.label('event'),
+        Customer.name.label('customer')
+    ).select_from(Expense).outerjoin(Facility).outerjoin(Event).outerjoin(Customer).filter(
+        Expense.expense_date.between(start_date, end_date)
+    )
+    return filter_groups(query, Expense, facility_id, event_id, customer_id)
+
+
+def revenue_detail(start_date, end_date, cursor=None, per_page=50, **filters):
+    """Individual payments behind a group, one keyset page at a time."""
+    return keyset_paginate(revenue_rows(start_date, end_date, **filters),
+                           [Revenue.payment_date, Revenue.id], descending=True,
+                           cursor=cursor, per_page=per_page)
+
+
+def expense_detail(start_date, end_date, cursor=None, per_page=50, **filters):
+    """Individual expenses behind a group, one keyset page at a time."""
+    return keyset_paginate(expense_rows(start_date, end_date, **filters),
+                           [Expense.expense_date, Expense.id], descending=True,
+                           cursor=cursor, per_page=per_page)
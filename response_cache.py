@@ -0,0 +1,223 @@
+from app import app, db
+from models import TableVersion
+import upsert
+from flask import request, session, make_response, Response
+from principal import current_principal
+from commit_hooks import invalidate_on_commit
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+import hashlib
+import importlib
+import os
+import threading
+import time
+
+# RESPONSE_CACHE=0 turns the cache off
+app.config.setdefault('RESPONSE_CACHE_ENABLED', os.environ.get('RESPONSE_CACHE', '1') != '0')
+# Rendered responses kept per worker
+app.config.setdefault('RESPONSE_CACHE_SIZE', int(os.environ.get('RESPONSE_CACHE_SIZE', 256)))
+# How long (seconds) a worker trusts its copy of the table versions. Its own
+# commits refresh them at once; writes by other workers show up within this.
+app.config.setdefault('RESPONSE_CACHE_VERSION_TTL', float(os.environ.get('RESPONSE_CACHE_VERSION_TTL', 2)))
+# Bodies larger than this (bytes) are not cached
+app.config.setdefault('RESPONSE_CACHE_MAX_BODY', 1024 * 1024)
+# Optional backend shared by all workers, as 'module:factory'
+app.config.setdefault('RESPONSE_CACHE_BACKEND', os.environ.get('RESPONSE_CACHE_BACKEND'))
+
+# Every cached page shows the company settings
+ALWAYS_DEPENDS_ON = ('system_settings',)
+
+# session.info key: the connection the session's transaction runs on, once it has one
+CONNECTION_KEY = 'transaction_connection'
+
+
+class CacheBackend:
+    """Where rendered responses are kept. A shared backend (e.g. one backed
+    by Redis or memcached) implements these two methods; values are bytes
+    plus a mimetype and must come back unchanged."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+
+class LRUBackend(CacheBackend):
+    """A bounded least-recently-used cache in this worker's memory."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_lock = threading.Lock()
+_state = {'versions': {}, 'checked_at': 0.0, 'backends': None}
+
+
+def backends():
+    """The local LRU, followed by the shared backend when one is configured."""
+    if _state['backends'] is None:
+        chain = [LRUBackend(app.config['RESPONSE_CACHE_SIZE'])]
+        if app.config['RESPONSE_CACHE_BACKEND']:
+            module, factory = app.config['RESPONSE_CACHE_BACKEND'].split(':')
+            chain.append(getattr(importlib.import_module(module), factory)())
+        _state['backends'] = chain
+    return _state['backends']
+
+
+def table_versions():
+    """``{table_name: version}``, re-read at most every RESPONSE_CACHE_VERSION_TTL."""
+    now = time.monotonic()
+    if now - _state['checked_at'] < app.config['RESPONSE_CACHE_VERSION_TTL']:
+        return _state['versions']
+    versions = dict(db.session.query(TableVersion.table_name, TableVersion.version).all())
+    with _lock:
+        _state['versions'], _state['checked_at'] = versions, now
+    return versions
+
+
+def expire_versions():
+    with _lock:
+        _state['checked_at'] = 0.0
+
+
+def _cache_key(tables):
+    principal = current_principal()
+    versions = table_versions()
+    parts = [
+        request.endpoint,
+        request.full_path,
+        f'{principal.id}:{principal.role}' if principal else 'anonymous',
+        # Default date ranges and "this month" figures move at midnight
+        date.today().isoformat(),
+    ] + [f'{table}={versions.get(table, 0)}' for table in tables]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _lookup(key):
+    chain = backends()
+    for i, backend in enumerate(chain):
+        value = backend.get(key)
+        if value is not None:
+            # Fill the faster levels in front of the one that had it
+            for faster in chain[:i]:
+                faster.set(key, value)
+            return value
+    return None
+
+
+def _conditional(body, mimetype, etag):
+    response = make_response(body) if body is not None else Response(status=304)
+    if body is not None:
+        response.mimetype = mimetype
+    response.set_etag(etag)
+    # Browsers keep the page but ask every time; unchanged pages come back as 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_response(*tables):
+    """Cache a GET view's rendered response until one of ``tables`` is written.
+
+    Keyed by endpoint, query string, user and role, today's date and the
+    write versions of the tables the page reads, so no explicit invalidation
+    is needed. Pages with pending flash messages are always rendered.
+    """
+    tables = tuple(sorted(set(tables + ALWAYS_DEPENDS_ON)))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (not app.config['RESPONSE_CACHE_ENABLED'] or request.method != 'GET'
+                    or session.get('_flashes')):
+                return view(*args, **kwargs)
+
+            key = _cache_key(tables)
+            etag = key[:32]
+            if request.if_none_match.contains(etag):
+                return _conditional(None, None, etag)
+
+            cached = _lookup(key)
+            if cached is not None:
+                return _conditional(cached[0], cached[1], etag)
+
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code == 200 and not response.is_streamed
+                    and not session.get('_flashes')):
+                body = response.get_data()
+                if len(body) <= app.config['RESPONSE_CACHE_MAX_BODY']:
+                    for backend in backends():
+                        backend.set(key, (body, response.mimetype))
+                    response.set_etag(etag)
+                    response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+# Every INSERT/UPDATE/DELETE notes its table on the connection, whether it
+# came from an ORM flush or a Core statement (bulk imports, ledger updates).
+@event.listens_for(Engine, 'after_cursor_execute')
+def _note_written_table(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not (context.isinsert or context.isupdate or context.isdelete):
+        return
+    table = getattr(getattr(context.compiled, 'statement', None), 'table', None)
+    name = getattr(table, 'name', None)
+    if name and name != TableVersion.__tablename__:
+        conn.info.setdefault('written_tables', set()).add(name)
+
+
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def _forget_written_tables(conn):
+    conn.info.pop('written_tables', None)
+
+
+@event.listens_for(Session, 'after_begin')
+def _note_connection(session, transaction, connection):
+    session.info[CONNECTION_KEY] = connection
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_connection(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(CONNECTION_KEY, None)
+
+
+# The versions move in the same transaction as the writes.
+@event.listens_for(Session, 'before_commit')
+def _bump_table_versions(session):
+    session.flush()
+    # session.connection() would check one out for a commit that has nothing to do
+    connection = session.info.get(CONNECTION_KEY)
+    written = connection is not None and connection.info.pop('written_tables', None)
+    if not written:
+        return
+    for table_name in sorted(written):
+        upsert.increment(connection, TableVersion.__table__,
+                         {'table_name': table_name}, {'version': 1})
+    invalidate_on_commit(session, _expire_after_commit)
+
+
+def _expire_after_commit(keys):
+    expire_versions()
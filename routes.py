@@ -1,51 +1,90 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from app import app, db, bcrypt
 from models import *
 from datetime import datetime, date, timedelta
 from functools import wraps
+import io
+import json
 from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import joinedload, defer
+from pagination import keyset_paginate
+from event_index import events_for_facility
+from dashboard_stats import get_dashboard_stats
+from report_engine import (report_date_range, income_expense_summary, revenue_detail, expense_detail,
+                           group_filter)
+from exports import stream_export, EXPORTS, FORMATS, ALL_TIME
+from settings_cache import to_decimal
+from principal import current_principal, has_role
+from passwords import verify_password, hash_password, needs_rehash, PasswordServiceBusy
+from ledger import record_payment
+from booking_service import (create_booking, create_series, expand_series, series_conflicts,
+                             BookingError, BookingConflict, SeriesConflict)
+from importer import import_csv, IMPORTERS
+from customer_search import search_customers, prefix_condition
+from lookups import booking_options, facility_options, PAYMENT_STATUSES
+from response_cache import cached_response
+from cash_ledger import (record_transaction, balances as cash_balances, CashLedgerError,
+                         LOCATIONS as CASH_LOCATIONS, CURRENCIES as CASH_CURRENCIES,
+                         TRANSACTION_TYPES as CASH_TRANSACTION_TYPES)
+from availability import find_booking, facility_availability, month_range, MAX_RANGE_DAYS
+from utilization import facility_utilization, MAX_WINDOW_DAYS
+from jobs import enqueue, JobError, JOB_VIEWER_ROLES
+
+# Loading strategy for each list view. Every relationship a list template
+# touches is joined into the page query, so one page costs the same small,
+# fixed number of queries however many rows it shows.
+def booking_list_options():
+    return (
+        joinedload(Booking.customer),
+        joinedload(Booking.facility),
+        joinedload(Booking.event),
+    )
+
+def revenue_list_options():
+    return (
+        joinedload(Revenue.booking).joinedload(Booking.customer),
+    )
+
+def expense_list_options():
+    return (
+        joinedload(Expense.facility),
+        joinedload(Expense.customer),
+    )
+
+def list_page_args():
+    # ?cursor=<opaque token> moves between pages; ?count=1 adds the total,
+    # which is left off by default because it needs a COUNT(*) over the table.
+    return {
+        'cursor': request.args.get('cursor'),
+        'per_page': 20,
+        'with_total': request.args.get('count') == '1',
+    }
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if current_principal() is None:
+            # Signed out, deleted or deactivated
+            session.clear()
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return redirect(url_for('login'))
-        user = User.query.get(session['user_id'])
-        if user.role != 'admin':
-            flash('Access denied. Admin privileges required.', 'error')
-            return redirect(url_for('dashboard'))
-        return f(*args, **kwargs)
-    return decorated_function
-@app.route('/init-db')
-def init_database():
-    """Initialize database tables - run this once"""
-    try:
-        db.drop_all()  # Clear existing tables
-        db.create_all()  # Create fresh tables
-        
-        # Create default admin user
-        admin_password = bcrypt.generate_password_hash('admin123').decode('utf-8')
-        admin = User(
-            username='admin',
-            password_hash=admin_password,
-            role='admin',
-            full_name='System Administrator',
-            email='admin@dujar.com'
-        )
-        db.session.add(admin)
-        db.session.commit()
-        
-        return "Database initialized successfully! <a href='/'>Go to Login</a>"
-    except Exception as e:
-        return f"Error: {str(e)}"
+def role_required(*roles):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if current_principal() is None:
+                session.clear()
+                return redirect(url_for('login'))
+            if not has_role(*roles):
+                flash(f"Access denied. {' or '.join(r.title() for r in roles)} privileges required.", 'error')
+                return redirect(url_for('dashboard'))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+admin_required = role_required('admin')
 
 @app.route('/')
 def index():
@@ -61,7 +100,20 @@ def login():
         
         user = User.query.filter_by(username=username, is_active=True).first()
         
-        if user and bcrypt.check_password_hash(user.password_hash, password):
+        try:
+            authenticated = user is not None and verify_password(user.password_hash, password)
+        except PasswordServiceBusy:
+            flash('The server is busy, please try logging in again', 'error')
+            return render_template('login.html'), 503
+        
+        if authenticated:
+            # Upgrade the hash if the configured work factor has changed
+            if needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = hash_password(password)
+                except PasswordServiceBusy:
+                    pass
+            
             session['user_id'] = user.id
             session['username'] = user.username
             session['role'] = user.role
@@ -85,44 +137,27 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@cached_response('bookings', 'customers', 'facilities', 'events', 'dashboard_stats')
 def dashboard():
-    # Get dashboard statistics
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(payment_status='pending').count()
-    total_customers = Customer.query.count()
-    total_facilities = Facility.query.count()
+    # Get dashboard statistics (precomputed, see dashboard_stats.py)
+    stats = get_dashboard_stats()
     
-    # Recent bookings
-    recent_bookings = Booking.query.order_by(Booking.created_date.desc()).limit(5).all()
-    
-    # Monthly revenue
-    current_month = datetime.now().month
-    current_year = datetime.now().year
-    monthly_revenue_usd = db.session.query(func.sum(Revenue.amount_usd)).filter(
-        func.extract('month', Revenue.payment_date) == current_month,
-        func.extract('year', Revenue.payment_date) == current_year
-    ).scalar() or 0
-    
-    monthly_revenue_lrd = db.session.query(func.sum(Revenue.amount_lrd)).filter(
-        func.extract('month', Revenue.payment_date) == current_month,
-        func.extract('year', Revenue.payment_date) == current_year
-    ).scalar() or 0
+    # Recent bookings (id order follows creation order and uses the primary key)
+    recent_bookings = Booking.query.options(*booking_list_options()).order_by(
+        Booking.id.desc()).limit(5).all()
     
     return render_template('dashboard.html',
-                         total_bookings=total_bookings,
-                         pending_bookings=pending_bookings,
-                         total_customers=total_customers,
-                         total_facilities=total_facilities,
                          recent_bookings=recent_bookings,
-                         monthly_revenue_usd=monthly_revenue_usd,
-                         monthly_revenue_lrd=monthly_revenue_lrd)
+                         **stats)
 
 @app.route('/bookings')
 @login_required
+@cached_response('bookings', 'customers', 'facilities', 'events')
 def bookings():
-    page = request.args.get('page', 1, type=int)
-    bookings = Booking.query.order_by(Booking.booking_date.desc()).paginate(
-        page=page, per_page=20, error_out=False)
+    bookings = keyset_paginate(
+        Booking.query.options(*booking_list_options()),
+        [Booking.booking_date, Booking.id], descending=True,
+        **list_page_args())
     return render_template('bookings.html', bookings=bookings)
 
 @app.route('/bookings/new', methods=['GET', 'POST'])
@@ -135,91 +170,93 @@ def new_booking():
             facility_id = request.form['facility_id']
             event_id = request.form['event_id']
             booking_date = datetime.strptime(request.form['booking_date'], '%Y-%m-%d').date()
-            advance_amount = float(request.form.get('advance_amount', 0))
+            advance_amount = to_decimal(request.form.get('advance_amount'))
             currency_type = request.form['currency_type']
             notes = request.form.get('notes', '')
             
-            # Check if date is available
-            existing_booking = Booking.query.filter_by(
-                facility_id=facility_id, 
-                booking_date=booking_date
-            ).first()
-            
-            if existing_booking:
-                flash('This facility is already booked for the selected date', 'error')
-                return redirect(url_for('new_booking'))
-            
-            # Get facility fee
-            facility = Facility.query.get(facility_id)
-            
-            # Create booking
-            booking = Booking(
-                customer_id=customer_id,
-                facility_id=facility_id,
-                event_id=event_id,
-                booking_date=booking_date,
-                total_fee_usd=facility.usd_fee,
-                notes=notes,
-                created_by=session['user_id']
-            )
-            
-            # Set advance payment
-            if currency_type == 'USD':
-                booking.advance_paid_usd = advance_amount
-            else:
-                booking.advance_paid_lrd = advance_amount
-            
-            # Set payment status
-            if advance_amount >= float(facility.usd_fee):
-                booking.payment_status = 'complete'
-                booking.booking_status = 'confirmed'
-            elif advance_amount > 0:
-                booking.payment_status = 'partial'
-                booking.booking_status = 'confirmed'
-            
-            db.session.add(booking)
-            db.session.commit()
-            
-            # Create revenue entry if advance payment made
-            if advance_amount > 0:
-                revenue = Revenue(
-                    booking_id=booking.id,
-                    payment_date=date.today(),
-                    currency_type=currency_type,
-                    recorded_by=session['user_id']
-                )
-                
-                if currency_type == 'USD':
-                    revenue.amount_usd = advance_amount
-                else:
-                    revenue.amount_lrd = advance_amount
-                
-                db.session.add(revenue)
-                db.session.commit()
+            # Create the booking and any advance payment in one transaction;
+            # a double booking comes back as BookingConflict
+            create_booking(customer_id, facility_id, event_id, booking_date,
+                           created_by=session['user_id'],
+                           advance_amount=advance_amount,
+                           currency_type=currency_type,
+                           notes=notes)
             
             flash('Booking created successfully!', 'success')
             return redirect(url_for('bookings'))
             
+        except BookingError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('new_booking'))
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating booking: {str(e)}', 'error')
     
-    customers = Customer.query.all()
+    # Customers are picked through /api/customers/search rather than a
+    # dropdown of the whole table
     facilities = Facility.query.filter_by(status='active').all()
     events = Event.query.all()
     
     return render_template('new_booking.html', 
-                         customers=customers, 
                          facilities=facilities, 
                          events=events)
 
+@app.route('/bookings/series', methods=['POST'])
+@login_required
+def new_booking_series():
+    # Book a facility on many dates in one request: rule=weekly (optional
+    # weekdays=0,2 and interval=<weeks>) or rule=weekdays from start_date to
+    # end_date, or rule=dates with dates=YYYY-MM-DD,... Taken dates are
+    # skipped and listed; all_or_nothing=1 books none of them if any is
+    # taken, and dry_run=1 only lists the dates and conflicts.
+    form = request.values
+    parse_date = lambda value: datetime.strptime(value.strip(), '%Y-%m-%d').date()
+    try:
+        customer_id = int(form['customer_id'])
+        facility_id = int(form['facility_id'])
+        event_id = int(form['event_id'])
+        dates = expand_series(
+            form.get('rule', 'weekly'),
+            start_date=parse_date(form['start_date']) if form.get('start_date') else None,
+            end_date=parse_date(form['end_date']) if form.get('end_date') else None,
+            weekdays=[int(d) for d in form.get('weekdays', '').split(',') if d.strip()],
+            interval=form.get('interval', 1, type=int),
+            dates=[parse_date(d) for d in form.get('dates', '').split(',') if d.strip()])
+    except (KeyError, ValueError, OverflowError):
+        return jsonify({'error': 'Expected customer_id, facility_id, event_id and a repeat rule with its dates'}), 400
+    except BookingError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if form.get('dry_run') == '1':
+        conflicts = series_conflicts(facility_id, dates)
+        return jsonify({'dates': [d.isoformat() for d in dates],
+                        'conflicts': [d.isoformat() for d in conflicts]})
+    
+    try:
+        created, conflicts = create_series(customer_id, facility_id, event_id, dates,
+                                           created_by=session['user_id'],
+                                           all_or_nothing=form.get('all_or_nothing') == '1',
+                                           notes=form.get('notes', ''))
+    except SeriesConflict as e:
+        return jsonify({'error': str(e), 'created': [],
+                        'conflicts': [d.isoformat() for d in e.dates]}), 409
+    except BookingError as e:
+        return jsonify({'error': str(e)}), 409 if isinstance(e, BookingConflict) else 400
+    
+    return jsonify({
+        'created': [{'id': booking_id, 'date': booking_date.isoformat()} for booking_id, booking_date in created],
+        'conflicts': [d.isoformat() for d in conflicts],
+    }), 201 if created else 409
+
 @app.route('/customers')
 @login_required
+@cached_response('customers')
 def customers():
-    page = request.args.get('page', 1, type=int)
-    customers = Customer.query.order_by(Customer.name).paginate(
-        page=page, per_page=20, error_out=False)
-    return render_template('customers.html', customers=customers)
+    # Optional ?q= narrows the list to name/phone/email prefix matches
+    search = request.args.get('q', '').strip()
+    query = Customer.query.filter(prefix_condition(search)) if search else Customer.query
+    customers = keyset_paginate(query, [Customer.name, Customer.id], **list_page_args())
+    return render_template('customers.html', customers=customers, search=search)
 
 @app.route('/customers/new', methods=['GET', 'POST'])
 @login_required
@@ -244,10 +281,12 @@ def new_customer():
 
 @app.route('/revenue')
 @login_required
+@cached_response('revenue', 'bookings', 'customers')
 def revenue():
-    page = request.args.get('page', 1, type=int)
-    revenue_entries = Revenue.query.order_by(Revenue.payment_date.desc()).paginate(
-        page=page, per_page=20, error_out=False)
+    revenue_entries = keyset_paginate(
+        Revenue.query.options(*revenue_list_options()),
+        [Revenue.payment_date, Revenue.id], descending=True,
+        **list_page_args())
     return render_template('revenue.html', revenue_entries=revenue_entries)
 
 @app.route('/revenue/new', methods=['GET', 'POST'])
@@ -265,25 +304,14 @@ def new_revenue():
                 recorded_by=session['user_id']
             )
             
-            amount = float(request.form['amount'])
+            amount = to_decimal(request.form['amount'])
             if revenue.currency_type == 'USD':
                 revenue.amount_usd = amount
             else:
                 revenue.amount_lrd = amount
             
-            db.session.add(revenue)
-            
-            # Update booking payment status
-            booking = Booking.query.get(revenue.booking_id)
-            total_paid_usd = db.session.query(func.sum(Revenue.amount_usd)).filter_by(
-                booking_id=booking.id).scalar() or 0
-            
-            booking.advance_paid_usd = total_paid_usd
-            
-            if total_paid_usd >= float(booking.total_fee_usd):
-                booking.payment_status = 'complete'
-            elif total_paid_usd > 0:
-                booking.payment_status = 'partial'
+            # Insert the payment and post it to the booking's running totals
+            record_payment(revenue)
             
             db.session.commit()
             flash('Revenue entry added successfully!', 'success')
@@ -293,15 +321,18 @@ def new_revenue():
             db.session.rollback()
             flash(f'Error adding revenue: {str(e)}', 'error')
     
-    bookings = Booking.query.filter(Booking.payment_status.in_(['pending', 'partial'])).all()
-    return render_template('new_revenue.html', bookings=bookings)
+    # Bookings awaiting payment are picked through
+    # /api/lookup/bookings?status=pending,partial
+    return render_template('new_revenue.html')
 
 @app.route('/expenses')
 @login_required
+@cached_response('expenses', 'facilities', 'customers')
 def expenses():
-    page = request.args.get('page', 1, type=int)
-    expenses = Expense.query.order_by(Expense.expense_date.desc()).paginate(
-        page=page, per_page=20, error_out=False)
+    expenses = keyset_paginate(
+        Expense.query.options(*expense_list_options()),
+        [Expense.expense_date, Expense.id], descending=True,
+        **list_page_args())
     return render_template('expenses.html', expenses=expenses)
 
 @app.route('/expenses/new', methods=['GET', 'POST'])
@@ -323,7 +354,7 @@ def new_expense():
                 recorded_by=session['user_id']
             )
             
-            amount = float(request.form['amount'])
+            amount = to_decimal(request.form['amount'])
             if expense.currency_type == 'USD':
                 expense.amount_usd = amount
             else:
@@ -338,10 +369,10 @@ def new_expense():
             db.session.rollback()
             flash(f'Error adding expense: {str(e)}', 'error')
     
-    bookings = Booking.query.all()
+    # Bookings and customers are picked through /api/lookup/bookings and
+    # /api/customers/search; facilities and events are small tables
     facilities = Facility.query.all()
     events = Event.query.all()
-    customers = Customer.query.all()
     
     expense_categories = [
         'Staff Fees', 'Security', 'DJ Fee', 'Cleaning', 
@@ -349,12 +380,55 @@ def new_expense():
     ]
     
     return render_template('new_expense.html', 
-                         bookings=bookings, 
                          facilities=facilities,
                          events=events,
-                         customers=customers,
                          expense_categories=expense_categories)
 
+@app.route('/cash')
+@login_required
+def cash():
+    # Vault/bank balances (optionally as of ?as_of=YYYY-MM-DD) and movements
+    as_of = request.args.get('as_of')
+    try:
+        as_of = datetime.strptime(as_of, '%Y-%m-%d').date() if as_of else None
+    except ValueError:
+        as_of = None
+    
+    transactions = keyset_paginate(
+        CashManagement.query, [CashManagement.transaction_date, CashManagement.id],
+        descending=True, **list_page_args())
+    return render_template('cash.html',
+                         balances=cash_balances(as_of),
+                         as_of=as_of,
+                         transactions=transactions,
+                         locations=CASH_LOCATIONS,
+                         currencies=CASH_CURRENCIES,
+                         transaction_types=CASH_TRANSACTION_TYPES)
+
+@app.route('/cash/new', methods=['POST'])
+@role_required('admin', 'staff')
+def new_cash_transaction():
+    try:
+        record_transaction(
+            request.form['transaction_type'],
+            request.form['location'],
+            request.form['currency_type'],
+            to_decimal(request.form['amount']),
+            datetime.strptime(request.form['transaction_date'], '%Y-%m-%d').date(),
+            to_location=request.form.get('to_location') or None,
+            description=request.form.get('description', ''),
+            recorded_by=session['user_id']
+        )
+        db.session.commit()
+        flash('Cash transaction recorded successfully!', 'success')
+    except CashLedgerError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error recording cash transaction: {str(e)}', 'error')
+    return redirect(url_for('cash'))
+
 @app.route('/reports')
 @login_required
 def reports():
@@ -362,38 +436,138 @@ def reports():
 
 @app.route('/reports/income-expense')
 @login_required
+@cached_response('financial_daily', 'revenue', 'expenses', 'bookings', 'facilities', 'events', 'customers')
 def income_expense_report():
     # Get date range from query parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    start_date, end_date = report_date_range(request.args)
     
-    if not start_date:
-        start_date = (date.today() - timedelta(days=30)).strftime('%Y-%m-%d')
-    if not end_date:
-        end_date = date.today().strftime('%Y-%m-%d')
+    # Grouped totals with subtotals, aggregated in the database
+    summary = income_expense_summary(start_date, end_date)
     
-    # Revenue data
-    revenue_query = db.session.query(
-        Revenue, Booking, Facility, Event, Customer
-    ).join(Booking).join(Facility).join(Event).join(Customer).filter(
-        Revenue.payment_date.between(start_date, end_date)
-    ).order_by(Facility.name, Event.name, Customer.name)
+    # Optional drill-down into the rows behind one group
+    detail = None
+    detail_kind = request.args.get('detail')
+    if detail_kind in ('revenue', 'expenses'):
+        fetch_detail = revenue_detail if detail_kind == 'revenue' else expense_detail
+        detail = fetch_detail(start_date, end_date,
+                              facility_id=request.args.get('facility_id', type=group_filter),
+                              event_id=request.args.get('event_id', type=group_filter),
+                              customer_id=request.args.get('customer_id', type=group_filter),
+                              cursor=request.args.get('cursor'))
     
-    # Expense data
-    expense_query = db.session.query(
-        Expense, Facility, Event, Customer
-    ).outerjoin(Facility).outerjoin(Event).outerjoin(Customer).filter(
-        Expense.expense_date.between(start_date, end_date)
-    ).order_by(Facility.name, Event.name, Customer.name)
+    return render_template('income_expense_report.html',
+                         start_date=start_date.strftime('%Y-%m-%d'),
+                         end_date=end_date.strftime('%Y-%m-%d'),
+                         detail=detail,
+                         detail_kind=detail_kind,
+                         **summary)
+
+@app.route('/reports/export/<kind>')
+@login_required
+def export_report(kind):
+    # Stream revenue, expenses or bookings as CSV (default) or ?format=ndjson,
+    # over the same date range and group filters as the income/expense report.
+    # ?all=1 exports the full history.
+    fmt = request.args.get('format', 'csv')
+    if kind not in EXPORTS or fmt not in FORMATS:
+        return jsonify({'error': 'Unknown export'}), 404
     
-    revenue_data = revenue_query.all()
-    expense_data = expense_query.all()
+    if request.args.get('all') == '1':
+        start_date, end_date = ALL_TIME
+    else:
+        start_date, end_date = report_date_range(request.args)
     
-    return render_template('income_expense_report.html',
-                         revenue_data=revenue_data,
-                         expense_data=expense_data,
-                         start_date=start_date,
-                         end_date=end_date)
+    rows = stream_export(kind, fmt, start_date, end_date,
+                         facility_id=request.args.get('facility_id', type=group_filter),
+                         event_id=request.args.get('event_id', type=group_filter),
+                         customer_id=request.args.get('customer_id', type=group_filter))
+    filename = f"{kind}_{'all' if request.args.get('all') == '1' else f'{start_date}_{end_date}'}.{fmt}"
+    return Response(stream_with_context(rows), mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/reports/utilization')
+@login_required
+@cached_response('bookings', 'facilities')
+def utilization_report():
+    # Occupancy and revenue per available day for pricing, default the last year
+    start_date, end_date = report_date_range(request.args, default_days=365)
+    if end_date < start_date or (end_date - start_date).days >= MAX_WINDOW_DAYS:
+        flash(f'Range must be 1 to {MAX_WINDOW_DAYS} days', 'error')
+        start_date, end_date = report_date_range({}, default_days=365)
+    
+    return render_template('utilization_report.html',
+                         start_date=start_date.strftime('%Y-%m-%d'),
+                         end_date=end_date.strftime('%Y-%m-%d'),
+                         utilization=facility_utilization(start_date, end_date))
+
+@app.route('/api/utilization')
+@login_required
+def utilization_api():
+    # ?start_date=&end_date= (default the last year), optional ?facility_ids=1,2
+    start_date, end_date = report_date_range(request.args, default_days=365)
+    try:
+        facility_ids = [int(f) for f in request.args.get('facility_ids', '').split(',') if f.strip()]
+    except ValueError:
+        return jsonify({'error': 'Expected comma-separated facility_ids'}), 400
+    if end_date < start_date or (end_date - start_date).days >= MAX_WINDOW_DAYS:
+        return jsonify({'error': f'Range must be 1 to {MAX_WINDOW_DAYS} days'}), 400
+    
+    return jsonify(facility_utilization(start_date, end_date, facility_ids))
+
+def job_status(job):
+    status = {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'created': job.created_date.isoformat() if job.created_date else None,
+        'started': job.started_date.isoformat() if job.started_date else None,
+        'finished': job.finished_date.isoformat() if job.finished_date else None,
+        'error': job.error,
+        'status_url': url_for('job_detail', job_id=job.id),
+    }
+    if job.status == 'done':
+        status['download_url'] = url_for('job_download', job_id=job.id)
+    return status
+
+@app.route('/jobs/<kind>', methods=['POST'])
+@login_required
+def create_job(kind):
+    # Run a long report or export in the background worker (`flask run-worker`).
+    # Takes the same arguments as /reports/export/<kind> (plus export=<kind>)
+    # or the income/expense report; the same request while the data is
+    # unchanged returns the existing job.
+    try:
+        job = enqueue(kind, request.values, user_id=session.get('user_id'),
+                      any_owner=has_role(*JOB_VIEWER_ROLES))
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(job_status(job)), 200 if job.status == 'done' else 202
+
+def visible_job(job):
+    # Other users' jobs look like missing ones, unless the role sees every job
+    if job is None:
+        return False
+    return job.created_by == session.get('user_id') or has_role(*JOB_VIEWER_ROLES)
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_detail(job_id):
+    job = db.session.get(Job, job_id, options=[defer(Job.result)])
+    if not visible_job(job):
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<int:job_id>/download')
+@login_required
+def job_download(job_id):
+    job = db.session.get(Job, job_id)
+    if not visible_job(job):
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status != 'done':
+        return jsonify(job_status(job)), 409
+    return Response(job.result, mimetype=job.mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={job.filename}'})
 
 @app.route('/settings')
 @admin_required
@@ -406,6 +580,30 @@ def settings():
                          facilities=facilities,
                          users=users)
 
+@app.route('/import', methods=['GET', 'POST'])
+@admin_required
+def bulk_import():
+    report = None
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in IMPORTERS or not upload:
+            flash('Choose what to import and a CSV file', 'error')
+            return redirect(url_for('bulk_import'))
+        
+        # Parse the upload as a stream; it is never read into memory whole
+        report = import_csv(kind, io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+        
+        if request.form.get('error_report') and report.errors:
+            return Response(report.errors_csv(), mimetype='text/csv',
+                            headers={'Content-Disposition': f'attachment; filename={kind}_import_errors.csv'})
+        flash(f'Imported {report.inserted} {kind}, {len(report.errors)} rows rejected',
+              'success' if not report.errors else 'warning')
+        if report.file_error:
+            flash(f'Import stopped early: {report.file_error}', 'error')
+    
+    return render_template('import.html', report=report, kinds=sorted(IMPORTERS))
+
 @app.route('/api/check-availability')
 @login_required
 def check_availability():
@@ -417,10 +615,7 @@ def check_availability():
     
     try:
         booking_date = datetime.strptime(booking_date, '%Y-%m-%d').date()
-        existing_booking = Booking.query.filter_by(
-            facility_id=facility_id,
-            booking_date=booking_date
-        ).first()
+        existing_booking = find_booking(facility_id, booking_date)
         
         if existing_booking:
             return jsonify({
@@ -433,6 +628,70 @@ def check_availability():
     except Exception as e:
         return jsonify({'available': False, 'message': str(e)})
 
+@app.route('/api/availability-calendar')
+@login_required
+def availability_calendar():
+    # Free/booked days for several facilities over a month (?month=YYYY-MM)
+    # or an explicit range (?start=YYYY-MM-DD&end=YYYY-MM-DD), in one query.
+    facility_ids = request.args.get('facility_ids', '')
+    
+    try:
+        facility_ids = [int(f) for f in facility_ids.split(',') if f.strip()]
+        if request.args.get('month'):
+            month = datetime.strptime(request.args['month'], '%Y-%m')
+            start_date, end_date = month_range(month.year, month.month)
+        else:
+            start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Expected facility_ids and either month or start/end'}), 400
+    
+    if not facility_ids:
+        return jsonify({'error': 'Expected facility_ids'}), 400
+    if end_date < start_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+        return jsonify({'error': f'Range must be 1 to {MAX_RANGE_DAYS} days'}), 400
+    
+    availability = facility_availability(facility_ids, start_date, end_date)
+    return jsonify({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'facilities': {str(k): v for k, v in availability.items()}
+    })
+
+@app.route('/api/customers/search')
+@login_required
+def customer_search():
+    # Typeahead for customer pickers: ?q=<text>&page=<n>
+    page = request.args.get('page', 1, type=int)
+    results, has_more = search_customers(request.args.get('q', ''), page=page)
+    return jsonify({'results': results, 'page': page, 'has_more': has_more})
+
+@app.route('/api/lookup/bookings')
+@login_required
+def lookup_bookings():
+    # Booking picker options, filtered by ?customer_id=, ?facility_id=,
+    # ?start=/?end= (YYYY-MM-DD) and ?status=pending,partial; paged by ?cursor=
+    try:
+        start_date = request.args.get('start')
+        end_date = request.args.get('end')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    statuses = [s for s in request.args.get('status', '').split(',') if s in PAYMENT_STATUSES]
+    return jsonify(booking_options(customer_id=request.args.get('customer_id', type=int),
+                                   facility_id=request.args.get('facility_id', type=int),
+                                   start_date=start_date,
+                                   end_date=end_date,
+                                   statuses=statuses,
+                                   cursor=request.args.get('cursor')))
+
+@app.route('/api/lookup/facilities')
+@login_required
+def lookup_facilities():
+    return jsonify(facility_options())
+
 @app.route('/api/facility-events')
 @login_required
 def facility_events():
@@ -441,25 +700,9 @@ def facility_events():
         return jsonify([])
     
     # Get events that can be held in this facility
-    events = Event.query.all()
-    allowed_events = []
-    
-    for event in events:
-        if int(facility_id) in event.allowed_facilities:
-            allowed_events.append({
-                'id': event.id,
-                'name': event.name,
-                'description': event.description
-            })
+    try:
+        allowed_events = events_for_facility(facility_id)
+    except ValueError:
+        return jsonify([])
     
     return jsonify(allowed_events)
-    @app.route('/init-db')
-def init_database():
-    """Initialize database tables and default data"""
-    try:
-        # Create all tables
-        db.create_all()
-        
-        # Check if admin user exists
-        if not User.query.first():
-            # ... (rest of the code I provided)
@@ -0,0 +1,28 @@
+from app import app, db
+from models import User
+from migrations import apply_migrations
+from seed import seed_defaults
+import os
+
+# Local development server: migrate, seed an empty database, then serve.
+# Production runs gunicorn (see Procfile) and `flask --app app migrate`.
+if __name__ == '__main__':
+    with app.app_context():
+        try:
+            # Create missing tables and indexes
+            apply_migrations()
+            
+            # Check if admin user exists, if not create default data
+            if not User.query.first():
+                print("Creating default data...")
+                seed_defaults()
+                print("✅ Database initialized with default data!")
+            else:
+                print("✅ Database already has data")
+                
+        except Exception as e:
+            print(f"❌ Database initialization error: {e}")
+            db.session.rollback()
+    
+    port = int(os.environ.get('PORT', 5000))
+    app.run(host='0.0.0.0', port=port, debug=False)
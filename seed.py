@@ -0,0 +1,298 @@
+from app import app, db
+from models import (User, Facility, Event, Customer, Booking, Revenue, Expense,
+                    CashManagement, SystemSetting)
+from passwords import hash_password
+from cash_ledger import location_for
+import dashboard_stats
+from financial_rollup import rebuild_rollup
+from sqlalchemy import insert
+from datetime import date, timedelta
+from decimal import Decimal
+import click
+import random
+
+DEFAULT_FACILITIES = [
+    {'name': 'Auditorium', 'type': 'Event Hall', 'capacity': 500, 'usd_fee': 1500.00, 'description': 'Large auditorium for major events'},
+    {'name': 'Conference Room', 'type': 'Meeting Room', 'capacity': 50, 'usd_fee': 300.00, 'description': 'Professional conference room'},
+    {'name': 'Cafeteria', 'type': 'Dining Hall', 'capacity': 200, 'usd_fee': 500.00, 'description': 'Cafeteria for catering services'},
+    {'name': 'Classroom', 'type': 'Educational', 'capacity': 30, 'usd_fee': 150.00, 'description': 'Standard classroom'},
+    {'name': 'Office', 'type': 'Workspace', 'capacity': 10, 'usd_fee': 200.00, 'description': 'Private office space'}
+]
+
+DEFAULT_EVENTS = [
+    {'name': 'Wedding', 'description': 'Wedding reception ceremony', 'allowed_facilities': [1, 2]},
+    {'name': 'Party', 'description': 'Private party or celebration', 'allowed_facilities': [1, 2]},
+    {'name': 'Rally', 'description': 'Public rally or gathering', 'allowed_facilities': [1, 2]},
+    {'name': 'Catering Service', 'description': 'Food service and catering', 'allowed_facilities': [3]},
+    {'name': 'Schooling', 'description': 'Educational activities', 'allowed_facilities': [4, 5]},
+    {'name': 'Office Work', 'description': 'Business and office activities', 'allowed_facilities': [5]}
+]
+
+DEFAULT_SETTINGS = [
+    {'setting_key': 'usd_to_lrd_rate', 'setting_value': '190.00', 'description': 'Exchange rate from USD to LRD'},
+    {'setting_key': 'company_name', 'setting_value': 'DUJAR Facility Management', 'description': 'Company name'},
+    {'setting_key': 'company_address', 'setting_value': 'Monrovia, Liberia', 'description': 'Company address'}
+]
+
+# Rows generated per unit of --scale
+CUSTOMERS_PER_SCALE = 200
+BOOKINGS_PER_SCALE = 500
+EXPENSES_PER_SCALE = 300
+# Rows per multi-row INSERT
+SEED_CHUNK_SIZE = 1000
+
+FIRST_NAMES = ['James', 'Mary', 'Joseph', 'Esther', 'Emmanuel', 'Comfort', 'Samuel', 'Grace',
+               'Moses', 'Patience', 'Prince', 'Hawa', 'Musu', 'Momo', 'Fatu', 'Varney',
+               'Korto', 'Augustine', 'Josephine', 'Sekou']
+LAST_NAMES = ['Johnson', 'Kollie', 'Doe', 'Kamara', 'Sirleaf', 'Weah', 'Cooper', 'Taylor',
+              'Toe', 'Kromah', 'Flomo', 'Massaquoi', 'Tubman', 'Kpoto', 'Sackor', 'Gbollie']
+EXPENSE_CATEGORIES = {
+    'Cleaning': ('Hall cleaning', 'Cleaning supplies', 'Waste removal'),
+    'Utilities': ('Electricity', 'Water bill', 'Generator fuel'),
+    'Maintenance': ('Air conditioner repair', 'Plumbing', 'Painting', 'Chair repairs'),
+    'Security': ('Night guard', 'Event security'),
+    'Staff': ('Casual labour', 'Ushers'),
+}
+PAYMENT_METHODS = ['cash', 'cash', 'cash', 'mobile money', 'bank transfer']
+
+
+def seed_defaults():
+    """The admin user, facilities, events and settings every install starts with."""
+    db.session.add(User(
+        username='admin',
+        password_hash=hash_password('admin123'),
+        role='admin',
+        full_name='System Administrator',
+        email='admin@dujar.com'
+    ))
+    db.session.add_all(Facility(**data) for data in DEFAULT_FACILITIES)
+    db.session.add_all(Event(**data) for data in DEFAULT_EVENTS)
+    db.session.add_all(SystemSetting(**data) for data in DEFAULT_SETTINGS)
+    db.session.commit()
+
+
+def _insert(model, rows, returning=False):
+    table = model.__table__
+    ids = []
+    for start in range(0, len(rows), SEED_CHUNK_SIZE):
+        chunk = rows[start:start + SEED_CHUNK_SIZE]
+        if returning:
+            ids += db.session.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True), chunk).scalars().all()
+        else:
+            db.session.execute(insert(table), chunk)
+    return ids
+
+
+def _cash_row(transaction_type, when, currency_type, amount, location,
+              reference_type, reference_id, description, to_location=None):
+    return {
+        'transaction_date': when,
+        'transaction_type': transaction_type,
+        'amount_usd': amount if currency_type == 'USD' else 0,
+        'amount_lrd': amount if currency_type == 'LRD' else 0,
+        'currency_type': currency_type,
+        'location': location,
+        'from_location': location if to_location else None,
+        'to_location': to_location,
+        'description': description,
+        'reference_type': reference_type,
+        'reference_id': reference_id,
+    }
+
+
+def _customers(rng, count):
+    rows = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({
+            'name': f'{first} {last}',
+            'address': f'{rng.randint(1, 300)} {rng.choice(["Broad", "Carey", "Randall", "Tubman"])} Street, Monrovia',
+            'phone': f'+23177{rng.randint(0, 9999999):07d}',
+            'email': f'{first}.{last}{i}@example.com'.lower(),
+        })
+    return _insert(Customer, rows, returning=True)
+
+
+def _slots(rng, facility_ids, count, today):
+    # Distinct (facility, day) pairs, mostly in the past with some ahead
+    days = max(365, count // len(facility_ids) * 4 // 3)
+    first_day = today - timedelta(days=days - 180)
+    taken = set()
+    while len(taken) < count:
+        taken.add((rng.choice(facility_ids), first_day + timedelta(days=rng.randrange(days))))
+    return sorted(taken, key=lambda slot: slot[1])
+
+
+def _bookings(rng, count, customer_ids, user_id, rate, today):
+    facilities = {f.id: Decimal(str(f.usd_fee)) for f in Facility.query.all()}
+    events = {}
+    for event in Event.query.all():
+        for facility_id in event.allowed_facilities:
+            events.setdefault(int(facility_id), []).append(event.id)
+    facility_ids = [facility_id for facility_id in facilities if facility_id in events]
+
+    bookings, payments = [], []
+    for facility_id, booking_date in _slots(rng, facility_ids, count, today):
+        fee = facilities[facility_id]
+        # Past bookings are mostly paid up, future ones mostly carry a deposit
+        share = rng.choice([0, 0.5, 1, 1, 1] if booking_date < today else [0, 0.25, 0.5, 0.5])
+        paid_usd = paid_lrd = Decimal(0)
+        booking_payments = []
+        if share:
+            in_lrd = rng.random() < 0.3
+            amount = (fee * Decimal(str(share))).quantize(Decimal('0.01'))
+            half = (amount / 2).quantize(Decimal('0.01'))
+            for part in ((amount,) if rng.random() < 0.6 else (half, amount - half)):
+                currency_type = 'LRD' if in_lrd else 'USD'
+                if in_lrd:
+                    part = (part * rate).quantize(Decimal('0.01'))
+                    paid_lrd += part
+                else:
+                    paid_usd += part
+                booking_payments.append((currency_type, part))
+
+        paid_in_lrd = paid_usd * rate + paid_lrd
+        bookings.append({
+            'customer_id': rng.choice(customer_ids),
+            'facility_id': facility_id,
+            'event_id': rng.choice(events[facility_id]),
+            'booking_date': booking_date,
+            'total_fee_usd': fee,
+            'advance_paid_usd': paid_usd,
+            'advance_paid_lrd': paid_lrd,
+            'payment_status': ('complete' if paid_in_lrd >= fee * rate
+                               else 'partial' if paid_in_lrd > 0 else 'pending'),
+            'booking_status': 'confirmed' if paid_in_lrd > 0 else 'pending',
+            'notes': '',
+            'created_by': user_id,
+        })
+        payments.append(booking_payments)
+
+    booking_ids = _insert(Booking, bookings, returning=True)
+    revenue = []
+    for booking_id, values, booking_payments in zip(booking_ids, bookings, payments):
+        for currency_type, amount in booking_payments:
+            paid_on = values['booking_date'] - timedelta(days=rng.randint(0, 60))
+            revenue.append({
+                'booking_id': booking_id,
+                'payment_date': min(paid_on, today),
+                'amount_usd': amount if currency_type == 'USD' else 0,
+                'amount_lrd': amount if currency_type == 'LRD' else 0,
+                'currency_type': currency_type,
+                'payment_method': rng.choice(PAYMENT_METHODS),
+                'receipt_number': f'R{booking_id:07d}{len(revenue) % 10}',
+                'recorded_by': user_id,
+            })
+    revenue_ids = _insert(Revenue, revenue, returning=True)
+    return booking_ids, bookings, revenue_ids, revenue
+
+
+def _expenses(rng, count, booking_ids, bookings, user_id, rate, today):
+    rows = []
+    for _ in range(count):
+        category = rng.choice(list(EXPENSE_CATEGORIES))
+        currency_type = 'LRD' if rng.random() < 0.4 else 'USD'
+        amount = Decimal(rng.randint(10, 400))
+        if currency_type == 'LRD':
+            amount *= rate
+        values = {
+            'category': category,
+            'description': rng.choice(EXPENSE_CATEGORIES[category]),
+            'amount_usd': amount if currency_type == 'USD' else 0,
+            'amount_lrd': amount if currency_type == 'LRD' else 0,
+            'currency_type': currency_type,
+            'payment_method': rng.choice(PAYMENT_METHODS),
+            'recorded_by': user_id,
+            'booking_id': None,
+            'facility_id': None,
+            'event_id': None,
+            'customer_id': None,
+        }
+        # About half the expenses belong to a booking
+        if booking_ids and rng.random() < 0.5:
+            i = rng.randrange(len(booking_ids))
+            booking = bookings[i]
+            values.update(booking_id=booking_ids[i], facility_id=booking['facility_id'],
+                          event_id=booking['event_id'], customer_id=booking['customer_id'],
+                          expense_date=min(booking['booking_date'], today))
+        else:
+            values['expense_date'] = today - timedelta(days=rng.randrange(730))
+        rows.append(values)
+    return _insert(Expense, rows, returning=True), rows
+
+
+def _cash_movements(rng, revenue_ids, revenue, expense_ids, expenses, today):
+    # The same postings cash_ledger.py makes for rows saved through the app,
+    # plus a weekly vault-to-bank deposit
+    rows = []
+    for revenue_id, values in zip(revenue_ids, revenue):
+        currency_type = values['currency_type']
+        rows.append(_cash_row('deposit', values['payment_date'], currency_type,
+                              values['amount_usd'] if currency_type == 'USD' else values['amount_lrd'],
+                              location_for(values['payment_method']), 'revenue', revenue_id,
+                              f"Payment for booking #{values['booking_id']}"))
+    for expense_id, values in zip(expense_ids, expenses):
+        currency_type = values['currency_type']
+        rows.append(_cash_row('withdrawal', values['expense_date'], currency_type,
+                              values['amount_usd'] if currency_type == 'USD' else values['amount_lrd'],
+                              location_for(values['payment_method']), 'expense', expense_id,
+                              f"{values['category']}: {values['description']}"))
+    if rows:
+        day = min(row['transaction_date'] for row in rows)
+        while day <= today:
+            rows.append(_cash_row('transfer', day, 'USD', Decimal(rng.randint(1, 20) * 100),
+                                  'vault', 'transfer', None, 'Weekly bank deposit', to_location='bank'))
+            day += timedelta(days=7)
+    _insert(CashManagement, rows)
+    return len(rows)
+
+
+def seed(scale, random_seed=0):
+    """Generate ``scale`` units of realistic history with multi-row inserts.
+
+    Default data is created first if the database is empty. Returns the
+    number of rows generated per table.
+    """
+    if not User.query.first():
+        seed_defaults()
+    if Booking.query.first():
+        raise ValueError('seed needs a database without bookings')
+
+    rng = random.Random(random_seed)
+    today = date.today()
+    rate = Decimal(str(SystemSetting.query.filter_by(setting_key='usd_to_lrd_rate').first().setting_value))
+    user_id = User.query.filter_by(role='admin').first().id
+
+    customer_ids = _customers(rng, CUSTOMERS_PER_SCALE * scale)
+    booking_ids, bookings, revenue_ids, revenue = _bookings(
+        rng, BOOKINGS_PER_SCALE * scale, customer_ids, user_id, rate, today)
+    expense_ids, expenses = _expenses(rng, EXPENSES_PER_SCALE * scale, booking_ids, bookings,
+                                      user_id, rate, today)
+    cash = _cash_movements(rng, revenue_ids, revenue, expense_ids, expenses, today)
+    rebuild_rollup(db.session.connection())
+    db.session.commit()
+
+    # Bulk inserts bypass the flush listeners that keep the counters current
+    dashboard_stats.reconcile_dashboard_stats()
+    return {
+        'customers': len(customer_ids),
+        'bookings': len(booking_ids),
+        'revenue': len(revenue_ids),
+        'expenses': len(expense_ids),
+        'cash_management': cash,
+    }
+
+
+@app.cli.command('seed')
+@click.option('--scale', type=click.IntRange(min=1), default=1, show_default=True,
+              help=f'Units of data; each is {CUSTOMERS_PER_SCALE} customers and '
+                   f'{BOOKINGS_PER_SCALE} bookings with their payments and expenses.')
+@click.option('--random-seed', type=int, default=0, show_default=True)
+def seed_command(scale, random_seed):
+    """Fill an empty database with synthetic bookings, payments and expenses."""
+    try:
+        counts = seed(scale, random_seed)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
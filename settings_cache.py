@@ -0,0 +1,77 @@
+from app import app, db
+from models import SystemSetting
+from commit_hooks import on_commit_invalidate
+from sqlalchemy import func
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+import threading
+import time
+
+# How often (seconds) a worker checks the settings version stamp. Settings
+# are only re-read when the stamp has moved.
+app.config.setdefault('SETTINGS_CHECK_INTERVAL', 30)
+
+CENTS = Decimal('0.01')
+
+Settings = namedtuple('Settings', 'usd_to_lrd_rate company_name company_address')
+
+DEFAULTS = {
+    'usd_to_lrd_rate': '190.00',
+    'company_name': 'DUJAR Facility Management',
+    'company_address': 'Monrovia, Liberia',
+}
+
+_lock = threading.Lock()
+_state = {'settings': None, 'version': None, 'checked_at': 0.0}
+
+
+def _current_version():
+    # Any edit moves max(updated_date); the row count catches deletes.
+    return tuple(db.session.query(
+        func.max(SystemSetting.updated_date), func.count(SystemSetting.id)).one())
+
+
+def _load():
+    values = dict(DEFAULTS)
+    values.update(db.session.query(SystemSetting.setting_key, SystemSetting.setting_value).all())
+    try:
+        rate = Decimal(values['usd_to_lrd_rate'])
+    except InvalidOperation:
+        rate = Decimal(0)
+    if rate <= 0:
+        app.logger.error('Invalid usd_to_lrd_rate setting %r, using default', values['usd_to_lrd_rate'])
+        rate = Decimal(DEFAULTS['usd_to_lrd_rate'])
+    return Settings(rate, values['company_name'], values['company_address'])
+
+
+def get_settings():
+    """Typed system settings, cached per worker until their version stamp changes."""
+    now = time.monotonic()
+    if _state['settings'] is not None and now - _state['checked_at'] < app.config['SETTINGS_CHECK_INTERVAL']:
+        return _state['settings']
+
+    with _lock:
+        if _state['settings'] is None or now - _state['checked_at'] >= app.config['SETTINGS_CHECK_INTERVAL']:
+            version = _current_version()
+            if version != _state['version'] or _state['settings'] is None:
+                _state['settings'] = _load()
+                _state['version'] = version
+            _state['checked_at'] = now
+        return _state['settings']
+
+
+def invalidate():
+    with _lock:
+        _state['checked_at'] = 0.0
+
+
+def usd_to_lrd_rate():
+    return get_settings().usd_to_lrd_rate
+
+
+def to_decimal(amount):
+    return Decimal(str(amount or 0))
+
+
+# Re-check the version stamp as soon as this worker commits a settings change.
+on_commit_invalidate(lambda session, obj: isinstance(obj, SystemSetting), lambda keys: invalidate())
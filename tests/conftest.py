@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# app.py reads these at import time. The suite never uses the ambient
+# DATABASE_URL: set TEST_DATABASE_URL to an empty PostgreSQL database to run
+# it there, otherwise it gets a temporary SQLite file.
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = (os.environ.get('TEST_DATABASE_URL')
+                              or 'sqlite:///' + os.path.join(_db_dir, 'test.db'))
+os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+os.environ.setdefault('RESPONSE_CACHE', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from jinja2 import ChoiceLoader, DictLoader, TemplateNotFound
+from sqlalchemy import event, inspect
+
+from app import app as flask_app, db
+from models import User
+from migrations import apply_migrations
+from seed import seed_defaults
+from bench import FALLBACK_BASE_TEMPLATE
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config['TESTING'] = True
+    try:
+        flask_app.jinja_env.get_template('base.html')
+    except TemplateNotFound:
+        flask_app.jinja_loader = ChoiceLoader([flask_app.jinja_loader,
+                                               DictLoader({'base.html': FALLBACK_BASE_TEMPLATE})])
+    with flask_app.app_context():
+        existing = inspect(db.engine).get_table_names()
+        if existing:
+            pytest.exit(f"TEST_DATABASE_URL must point at an empty database; it has {', '.join(existing)}",
+                        returncode=2)
+        apply_migrations()
+        seed_defaults()
+    yield flask_app
+    with flask_app.app_context():
+        # Only the tables this session created
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+def login(client, username='admin'):
+    with client.application.app_context():
+        user = User.query.filter_by(username=username).one()
+        values = dict(user_id=user.id, username=user.username, role=user.role,
+                      full_name=user.full_name)
+    with client.session_transaction() as session:
+        session.update(values)
+    return client
+
+
+@pytest.fixture
+def client(app):
+    return login(app.test_client())
+
+
+@pytest.fixture
+def count_queries(app):
+    """Call as ``with count_queries() as queries:``; ``queries[0]`` is the statement count."""
+    @contextmanager
+    def counter():
+        queries = [0]
+
+        def count(*args):
+            queries[0] += 1
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            yield queries
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+    return counter
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def fresh_env(tmp_path):
+    """Environment for a separate interpreter with its own empty SQLite database."""
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'fresh.db'),
+               BCRYPT_LOG_ROUNDS='4')
+    env.pop('TEST_DATABASE_URL', None)
+    env.pop('FLASK_APP', None)
+    return env
+
+
+def run_command(args, env, timeout=60):
+    """Run ``args`` from the repository root in a new process."""
+    return subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True, timeout=timeout)
@@ -0,0 +1,127 @@
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import app as flask_app, db
+from models import Booking, Customer
+from booking_service import (create_booking, expand_series, is_date_conflict, BookingConflict,
+                             BookingError, MAX_SERIES_DATES)
+
+SQLITE_MESSAGE = 'UNIQUE constraint failed: bookings.facility_id, bookings.booking_date'
+POSTGRES_MESSAGE = ('duplicate key value violates unique constraint "uq_bookings_facility_date_active"\n'
+                    'DETAIL:  Key (facility_id, booking_date)=(1, 2033-01-01) already exists.')
+
+
+def integrity_error(message):
+    return IntegrityError('INSERT INTO bookings ...', {}, Exception(message))
+
+
+@pytest.fixture
+def customer_id(app):
+    with app.app_context():
+        customer = Customer(name='Concurrent Customer')
+        db.session.add(customer)
+        db.session.commit()
+        return customer.id
+
+
+@pytest.mark.parametrize('message', [SQLITE_MESSAGE, POSTGRES_MESSAGE])
+def test_date_conflict_messages(message):
+    assert is_date_conflict(integrity_error(message))
+
+
+def test_other_integrity_errors_are_not_conflicts():
+    assert not is_date_conflict(integrity_error('NOT NULL constraint failed: bookings.customer_id'))
+    assert not is_date_conflict(integrity_error(
+        'insert or update on table "bookings" violates foreign key constraint "bookings_customer_id_fkey"'))
+
+
+def test_concurrent_bookings_for_one_slot(app, customer_id):
+    booking_date = date(2033, 1, 1)
+    start = threading.Barrier(2)
+    results = []
+
+    def book():
+        with flask_app.app_context():
+            start.wait()
+            try:
+                booking = create_booking(customer_id, 1, 1, booking_date, created_by=None)
+                results.append(('booked', booking.id))
+            except BookingConflict:
+                results.append(('conflict', None))
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=book) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert sorted(outcome for outcome, _ in results) == ['booked', 'conflict']
+    with app.app_context():
+        assert Booking.query.filter_by(facility_id=1, booking_date=booking_date).count() == 1
+
+
+@pytest.mark.parametrize('message', [SQLITE_MESSAGE, POSTGRES_MESSAGE])
+def test_losing_insert_raises_conflict_and_rolls_back(app_context, customer_id, monkeypatch, message):
+    booking_date = date(2033, 2, 1)
+
+    def lose_the_race():
+        raise integrity_error(message)
+    monkeypatch.setattr(db.session, 'flush', lose_the_race)
+
+    with pytest.raises(BookingConflict):
+        create_booking(customer_id, 1, 1, booking_date, created_by=None,
+                       advance_amount=Decimal('50'))
+    monkeypatch.undo()
+    assert Booking.query.filter_by(facility_id=1, booking_date=booking_date).count() == 0
+
+
+def test_expand_series_weekly_interval():
+    dates = expand_series('weekly', date(2034, 1, 2), date(2034, 1, 31), weekdays=[0, 2], interval=2)
+    assert dates == [date(2034, 1, 2), date(2034, 1, 4), date(2034, 1, 16), date(2034, 1, 18),
+                     date(2034, 1, 30)]
+
+
+@pytest.mark.parametrize('weekdays', [[7], [-1], [0, 9]])
+def test_expand_series_rejects_unknown_weekdays(weekdays):
+    with pytest.raises(BookingError):
+        expand_series('weekly', date(2034, 1, 2), date(2034, 12, 31), weekdays=weekdays)
+
+
+def test_expand_series_caps_the_span():
+    start = date(2034, 1, 2)
+    with pytest.raises(BookingError):
+        expand_series('weekly', start, date(9999, 12, 31), weekdays=[0])
+    with pytest.raises(BookingError):
+        expand_series('weekly', start, start + timedelta(weeks=MAX_SERIES_DATES * 3), interval=3)
+    assert len(expand_series('weekly', start, start + timedelta(weeks=MAX_SERIES_DATES - 1))) == MAX_SERIES_DATES
+
+
+@pytest.mark.parametrize('values', [
+    {'start_date': '2034-01-02', 'end_date': '9999-12-31', 'weekdays': '9'},
+    {'start_date': '9999-12-27', 'end_date': '9999-12-31'},
+    {'start_date': '2034-01-02', 'end_date': '2034-02-01', 'interval': str(10 ** 9)},
+])
+def test_series_route_rejects_bad_rules(client, customer_id, values):
+    response = client.post('/bookings/series', data=dict(
+        values, customer_id=customer_id, facility_id=1, event_id=1, dry_run='1'))
+    assert response.status_code == 400
+
+
+def test_series_for_unknown_customer_is_rejected(client):
+    response = client.post('/bookings/series', data={
+        'customer_id': 999999, 'facility_id': 1, 'event_id': 1,
+        'rule': 'dates', 'dates': '2034-08-01'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown customer'
+
+
+def test_booking_for_unknown_customer_is_rejected(app_context):
+    with pytest.raises(BookingError, match='Unknown customer'):
+        create_booking(999999, 1, 1, date(2034, 8, 2), created_by=None)
+    assert Booking.query.filter_by(booking_date=date(2034, 8, 2)).count() == 0
@@ -0,0 +1,50 @@
+from app import db
+from models import Event, SystemSetting, User
+import event_index
+import principal
+import settings_cache
+
+
+def test_event_index_rebuilt_after_commit_only(app_context):
+    index = event_index.get_index()
+    event = Event.query.first()
+
+    event.description = 'changed, then rolled back'
+    db.session.flush()
+    db.session.rollback()
+    assert event_index.get_index() is index
+
+    event.description = 'changed'
+    db.session.commit()
+    assert event_index.get_index() is not index
+
+
+def test_settings_rechecked_after_commit_only(app_context):
+    settings_cache.get_settings()
+    setting = SystemSetting.query.filter_by(setting_key='company_name').one()
+
+    setting.setting_value = 'Rolled Back Ltd'
+    db.session.flush()
+    db.session.rollback()
+    assert settings_cache._state['checked_at'] != 0.0
+
+    setting.setting_value = 'Committed Ltd'
+    db.session.commit()
+    assert settings_cache.get_settings().company_name == 'Committed Ltd'
+
+
+def test_principal_forgotten_when_role_changes(app_context):
+    user = User(username='hooks-staff', password_hash='x', role='staff', full_name='Hooks', is_active=True)
+    db.session.add(user)
+    db.session.commit()
+    assert principal.load_principal(user.id).role == 'staff'
+
+    user.role = 'manager'
+    db.session.flush()
+    db.session.rollback()
+    assert user.id in principal._cache
+
+    user.role = 'manager'
+    db.session.commit()
+    assert user.id not in principal._cache
+    assert principal.load_principal(user.id).role == 'manager'
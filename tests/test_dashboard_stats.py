@@ -0,0 +1,24 @@
+from app import db
+from models import DashboardStat
+from dashboard_stats import (get_dashboard_stats, compute_dashboard_stats, reconcile_dashboard_stats,
+                             RECONCILED_KEY)
+
+
+def test_migrations_store_the_counters(app_context):
+    assert db.session.query(DashboardStat).filter_by(stat_key=RECONCILED_KEY).count() == 1
+
+
+def test_dashboard_read_never_writes_counters(app_context):
+    DashboardStat.query.delete()
+    db.session.commit()
+
+    stats = get_dashboard_stats()
+    expected = compute_dashboard_stats(db.session.connection())
+    assert stats['total_facilities'] == expected['total_facilities']
+    assert stats['total_bookings'] == expected['total_bookings']
+    db.session.rollback()
+    # Still unstored: the GET computed them read-only
+    assert DashboardStat.query.count() == 0
+
+    reconcile_dashboard_stats()
+    assert DashboardStat.query.filter_by(stat_key=RECONCILED_KEY).count() == 1
@@ -0,0 +1,117 @@
+import io
+from datetime import date
+
+from app import db
+from models import Customer, Expense, CashManagement, FinancialDaily
+from cash_ledger import balances
+from dashboard_stats import get_dashboard_stats
+from financial_rollup import rebuild_rollup
+from importer import import_csv
+
+
+def rollup_rows(day):
+    return sorted((row.kind, row.facility_id, row.event_id, row.customer_id, row.currency_type,
+                   float(row.amount_usd), float(row.amount_lrd), row.entries)
+                  for row in FinancialDaily.query.filter_by(day=day))
+
+
+def assert_rollup_current(day):
+    kept = rollup_rows(day)
+    rebuild_rollup(db.session.connection(), day, day)
+    assert rollup_rows(day) == kept
+    db.session.rollback()
+
+
+def test_import_moves_counters_and_rollup(app_context):
+    before = get_dashboard_stats()
+    report = import_csv('customers', io.StringIO('name,phone\nImported One,1\nImported Two,2\n'))
+    assert report.inserted == 2
+    customer_id = Customer.query.filter_by(name='Imported One').one().id
+
+    report = import_csv('bookings', io.StringIO(
+        'customer_id,facility_id,event_id,booking_date,advance_paid_usd\n'
+        f'{customer_id},1,1,2034-03-01,100\n'
+        f'{customer_id},2,1,2034-03-01,\n'))
+    assert report.inserted == 2 and not report.errors
+
+    report = import_csv('expenses', io.StringIO(
+        'expense_date,category,description,currency_type,amount,facility_id,event_id\n'
+        '2034-03-01,Repairs,Roof,USD,40,1,1\n'
+        '2034-03-01,Lighting,Bulbs,LRD,900,,\n'))
+    assert report.inserted == 2 and not report.errors
+
+    after = get_dashboard_stats()
+    assert after['total_customers'] == before['total_customers'] + 2
+    assert after['total_bookings'] == before['total_bookings'] + 2
+    assert after['pending_bookings'] == before['pending_bookings'] + 1
+    kinds = [row[0] for row in rollup_rows('2034-03-01')]
+    assert kinds.count('revenue') == 1 and kinds.count('expense') == 2
+    assert_rollup_current('2034-03-01')
+
+
+def test_expense_references_are_validated(app_context):
+    report = import_csv('expenses', io.StringIO(
+        'expense_date,category,description,currency_type,amount,facility_id,event_id,booking_id,customer_id\n'
+        '2034-04-01,Repairs,Unknown facility,USD,10,999,,,\n'
+        '2034-04-01,Repairs,Wrong facility,USD,10,3,1,,\n'
+        '2034-04-01,Repairs,Unknown booking,USD,10,,,999999,\n'
+        '2034-04-01,Repairs,Unknown customer,USD,10,,,,999999\n'
+        '2034-04-01,Repairs,Fine,USD,10,3,,,\n'))
+    assert report.inserted == 1
+    assert [line for line, _ in report.errors] == [2, 3, 4, 5]
+    assert 'facility 999 does not exist' in report.errors[0][1]
+    assert 'cannot be held in facility 3' in report.errors[1][1]
+
+
+def test_unreadable_file_is_reported(app_context):
+    stream = io.TextIOWrapper(io.BytesIO(b'name\nGood\n\xff\xfe bad\n'), encoding='utf-8')
+    report = import_csv('customers', stream)
+    assert report.inserted == 0
+    assert 'could not read the file' in report.file_error
+
+
+def test_unreadable_upload_is_not_a_server_error(client):
+    response = client.post('/import', data={
+        'kind': 'customers',
+        'file': (io.BytesIO(b'name\n\xff\xfe\n'), 'customers.csv'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        messages = [message for _, message in session['_flashes']]
+    assert any(message.startswith('Import stopped early') for message in messages)
+
+
+def test_imported_payments_and_expenses_post_to_the_cash_ledger(app_context):
+    before = balances()
+    customer_id = Customer.query.first().id
+    report = import_csv('bookings', io.StringIO(
+        'customer_id,facility_id,event_id,booking_date,advance_paid_usd,advance_paid_lrd\n'
+        f'{customer_id},1,1,2034-05-01,100,5000\n'))
+    assert report.inserted == 1
+    report = import_csv('expenses', io.StringIO(
+        'expense_date,category,description,currency_type,amount,payment_method\n'
+        '2034-05-01,Repairs,Roof,USD,40,bank transfer\n'))
+    assert report.inserted == 1
+
+    after = balances()
+    assert after[('vault', 'USD')] - before[('vault', 'USD')] == 100
+    assert after[('vault', 'LRD')] - before[('vault', 'LRD')] == 5000
+    assert after[('bank', 'USD')] - before[('bank', 'USD')] == -40
+    expense = Expense.query.filter_by(expense_date=date(2034, 5, 1)).one()
+    posting = CashManagement.query.filter_by(reference_type='expense', reference_id=expense.id).one()
+    assert posting.transaction_type == 'withdrawal' and posting.location == 'bank'
+
+
+def test_amounts_must_be_finite_and_fit_the_column(app_context):
+    report = import_csv('expenses', io.StringIO(
+        'expense_date,category,description,currency_type,amount\n'
+        '2034-07-01,Repairs,Not a number,USD,NaN\n'
+        '2034-07-01,Repairs,Signalling,USD,sNaN\n'
+        '2034-07-01,Repairs,Infinite,USD,Infinity\n'
+        '2034-07-01,Repairs,Too big,USD,1e30\n'
+        '2034-07-01,Repairs,Just too big,USD,100000000\n'
+        '2034-07-01,Repairs,Largest,USD,99999999.99\n'))
+    assert report.inserted == 1
+    assert [line for line, _ in report.errors] == [2, 3, 4, 5, 6]
+    assert 'amount must be a number' in report.errors[0][1]
+    assert 'must be less than 100,000,000' in report.errors[3][1]
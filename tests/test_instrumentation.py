@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+def test_metrics_are_local_only_without_a_token(app, client):
+    assert client.get('/metrics').status_code == 200
+    remote = client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'})
+    assert remote.status_code == 403
+
+
+def test_metrics_token_is_required_when_set(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'sekrit')
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer sekrit'},
+                          environ_base={'REMOTE_ADDR': '203.0.113.9'})
+    assert response.status_code == 200
+
+
+def test_failed_statement_leaves_no_timing_behind(app_context):
+    with db.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            conn.rollback()
+        conn.execute(text('SELECT 1'))
+        assert 'query_started' not in conn.info
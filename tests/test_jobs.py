@@ -0,0 +1,53 @@
+import pytest
+
+from app import db
+from models import Job, User
+from passwords import hash_password
+from jobs import claim_next, run_job
+from conftest import login
+
+REPORT = {'start_date': '2034-06-01', 'end_date': '2034-06-30'}
+
+
+@pytest.fixture(scope='module')
+def users(app):
+    with app.app_context():
+        for username, role in (('clerk1', 'staff'), ('clerk2', 'staff'), ('boss', 'manager')):
+            if not User.query.filter_by(username=username).first():
+                db.session.add(User(username=username, password_hash=hash_password('secret'),
+                                    role=role, full_name=username))
+        db.session.commit()
+
+
+def queue_report(client):
+    response = client.post('/jobs/report', data=REPORT)
+    assert response.status_code in (200, 202)
+    return response.get_json()['id']
+
+
+def test_jobs_are_private_to_their_owner(app, users):
+    owner = login(app.test_client(), 'clerk1')
+    other = login(app.test_client(), 'clerk2')
+    manager = login(app.test_client(), 'boss')
+
+    job_id = queue_report(owner)
+    with app.app_context():
+        run_job(claim_next())
+        db.session.remove()
+
+    for path in (f'/jobs/{job_id}', f'/jobs/{job_id}/download'):
+        assert owner.get(path).status_code == 200
+        assert manager.get(path).status_code == 200
+        assert other.get(path).status_code == 404
+
+    # The other clerk gets a job of their own rather than the owner's
+    other_id = queue_report(other)
+    assert other_id != job_id
+    assert other.get(f'/jobs/{other_id}').status_code == 200
+    assert manager.post('/jobs/report', data=REPORT).get_json()['id'] in (job_id, other_id)
+
+    with app.app_context():
+        run_job(claim_next())
+        # Finishing the other clerk's job leaves the owner's result alone
+        assert db.session.get(Job, job_id) is not None
+        db.session.remove()
@@ -0,0 +1,17 @@
+from decimal import Decimal
+
+from models import Booking
+from ledger import balance_due_usd
+
+
+def test_balance_due_counts_lrd_at_the_rate():
+    assert balance_due_usd(Decimal('300'), Decimal('100'), Decimal('9500'), rate=Decimal('190')) == Decimal('150.00')
+    assert balance_due_usd(Decimal('300'), 0, Decimal('57000'), rate=Decimal('190')) == Decimal('0.00')
+    assert balance_due_usd(Decimal('300'), Decimal('400'), 0, rate=Decimal('190')) == Decimal('0.00')
+
+
+def test_booking_balance_is_decimal(app_context):
+    booking = Booking(total_fee_usd=Decimal('300.00'), advance_paid_usd=Decimal('100.00'),
+                      advance_paid_lrd=None)
+    assert booking.balance_due_usd == Decimal('200.00')
+    assert isinstance(booking.balance_due_usd, Decimal)
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from app import db
+from models import Booking, Customer, Expense, Revenue
+
+LIST_PAGES = ['/bookings', '/customers', '/revenue', '/expenses']
+
+
+def add_rows(count, start):
+    """``count`` customers, each with a booking, a payment and an expense."""
+    for i in range(start, start + count):
+        customer = Customer(name=f'List Customer {i:04d}', phone=f'555{i:04d}')
+        db.session.add(customer)
+        db.session.flush()
+        booking = Booking(customer_id=customer.id, facility_id=i % 5 + 1, event_id=1,
+                          booking_date=date(2031, 1, 1) + timedelta(days=i), total_fee_usd=100)
+        db.session.add(booking)
+        db.session.flush()
+        db.session.add(Revenue(booking_id=booking.id, payment_date=booking.booking_date,
+                               amount_usd=50, currency_type='USD'))
+        db.session.add(Expense(booking_id=booking.id, facility_id=booking.facility_id,
+                               event_id=1, customer_id=customer.id,
+                               expense_date=booking.booking_date, category='Cleaning',
+                               description='List test', amount_usd=5, currency_type='USD'))
+    db.session.commit()
+
+
+def page_queries(client, count_queries):
+    counts = {}
+    for path in LIST_PAGES:
+        # Warm the per-worker caches (signed-in user, settings) first
+        assert client.get(path).status_code == 200
+        with count_queries() as queries:
+            assert client.get(path).status_code == 200
+        counts[path] = queries[0]
+    return counts
+
+
+def test_list_page_query_count_is_independent_of_rows(app, client, count_queries):
+    with app.app_context():
+        add_rows(2, start=0)
+    few = page_queries(client, count_queries)
+
+    with app.app_context():
+        add_rows(40, start=100)
+    many = page_queries(client, count_queries)
+
+    assert many == few
+    # The page query itself; relationships are joined into it
+    assert all(count <= 2 for count in many.values()), many
@@ -0,0 +1,22 @@
+from datetime import date
+from decimal import Decimal
+
+from app import db
+from models import Booking, Customer
+from lookups import booking_options
+from settings_cache import usd_to_lrd_rate
+
+
+def test_booking_label_counts_lrd_payments(app_context):
+    customer = Customer(name='Lookup Customer')
+    db.session.add(customer)
+    db.session.flush()
+    rate = usd_to_lrd_rate()
+    db.session.add(Booking(customer_id=customer.id, facility_id=2, event_id=1,
+                           booking_date=date(2034, 9, 1), total_fee_usd=Decimal('300.00'),
+                           advance_paid_usd=Decimal('100.00'), advance_paid_lrd=50 * rate,
+                           payment_status='partial', booking_status='confirmed'))
+    db.session.commit()
+
+    [option] = booking_options(customer_id=customer.id)['results']
+    assert option['label'].endswith('(balance $150.00)')
@@ -0,0 +1,62 @@
+import sys
+
+from sqlalchemy.dialects import postgresql
+
+from models import User, Booking, Customer
+from migrations import create_indexes, MIGRATIONS
+from conftest import run_command
+
+
+def test_init_db_is_not_a_web_route(app):
+    client = app.test_client()
+    assert client.get('/init-db').status_code == 404
+    assert client.post('/init-db').status_code == 404
+
+
+def test_migrate_command_is_idempotent(app, app_context):
+    result = app.test_cli_runner().invoke(args=['migrate'])
+    assert result.exit_code == 0, result.output
+    assert 'Schema is up to date' in result.output
+    assert User.query.filter_by(username='admin').count() == 1
+
+
+def test_cli_commands_registered_by_the_app_alone(fresh_env):
+    # A new interpreter, so nothing but app.py decides which modules load
+    flask = [sys.executable, '-m', 'flask', '--app', 'app']
+    result = run_command(flask + ['migrate'], fresh_env)
+    assert result.returncode == 0, result.stderr
+    assert 'Created the default admin user' in result.stdout
+
+    result = run_command(flask + ['migrate'], fresh_env)
+    assert 'Schema is up to date' in result.stdout
+    for command in ('migrate-status', 'explain-hot-queries', 'seed'):
+        result = run_command(flask + [command, '--help'], fresh_env)
+        assert result.returncode == 0, result.stderr
+
+
+class RecordingConnection:
+    """Stands in for a PostgreSQL connection and keeps the SQL it is given."""
+
+    def __init__(self):
+        self.dialect = postgresql.dialect()
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        return self
+
+    def first(self):
+        return None
+
+
+def test_postgresql_indexes_are_built_concurrently():
+    connection = RecordingConnection()
+    create_indexes((Booking, 'uq_bookings_facility_date_active'),
+                   (Customer, 'ix_customers_name_lower'))(connection)
+    ddl = [sql for sql in connection.statements if sql.startswith('CREATE')]
+    assert ddl[0].startswith('CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_bookings_facility_date_active')
+    assert 'WHERE' in ddl[0]
+    assert ddl[1].startswith('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customers_name_lower')
+
+    concurrent = {version for version, _, migrate in MIGRATIONS if getattr(migrate, 'concurrent', False)}
+    assert concurrent == {'0002', '0003', '0004', '0005'}
@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+
+from models import Booking
+from pagination import decode_cursor, encode_cursor
+
+COLUMNS = [Booking.booking_date, Booking.id]
+
+
+def tampered(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    tampered({'a': 1}),
+    tampered([]),
+    tampered('next'),
+    tampered(5),
+    tampered(['next', 'not-a-date', 1]),
+    tampered(['next', '2030-01-02', 'abc']),
+    tampered(['next', '2030-01-02', [1]]),
+    tampered(['next', '2030-01-02', None]),
+    tampered(['next', '2030-01-02', True]),
+    tampered(['next', 20300102, 1]),
+    'not base64 !!',
+])
+def test_bad_cursor_decodes_to_none(cursor):
+    assert decode_cursor(cursor, COLUMNS) == (None, None)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([date(2030, 1, 2), 7], 'next')
+    assert decode_cursor(cursor, COLUMNS) == ('next', [date(2030, 1, 2), 7])
+
+
+def test_tampered_cursor_is_not_an_error(client):
+    assert client.get('/bookings?cursor=' + tampered({'a': 1})).status_code == 200
+
+
+def test_cursor_values_take_their_column_type():
+    assert decode_cursor(tampered(['next', '2030-01-02', '7']), COLUMNS) == ('next', [date(2030, 1, 2), 7])
+
+
+@pytest.mark.parametrize('path', ['/bookings', '/customers', '/revenue', '/expenses'])
+def test_type_swapped_cursor_falls_back_to_the_first_page(client, path):
+    cursor = tampered(['next', {'a': 1}, 'not-an-id'])
+    assert client.get(f'{path}?cursor={cursor}').status_code == 200
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import passwords
+from passwords import PasswordServiceBusy, _run_in_pool
+
+
+@pytest.fixture
+def small_pool(app):
+    saved = {key: app.config[key] for key in ('BCRYPT_MAX_CONCURRENCY', 'PASSWORD_VERIFY_TIMEOUT')}
+    app.config.update(BCRYPT_MAX_CONCURRENCY=1, PASSWORD_VERIFY_TIMEOUT=0.2)
+    passwords._pool['pid'] = None
+    yield
+    app.config.update(saved)
+    passwords._pool['pid'] = None
+
+
+def test_timed_out_work_keeps_its_slot_until_it_finishes(small_pool):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return 'hashed'
+
+    # One running, one queued: both time out but the work is still there
+    with pytest.raises(PasswordServiceBusy):
+        _run_in_pool(slow_hash)
+    assert started.wait(1)
+    with pytest.raises(PasswordServiceBusy):
+        _run_in_pool(slow_hash)
+
+    # The queued one was cancelled and gave its slot back; the running one
+    # still holds its own
+    _, slots = passwords._executor()
+    assert slots.acquire(timeout=0.1)
+    assert not slots.acquire(timeout=0.1)
+    slots.release()
+
+    release.set()
+    assert _run_in_pool(lambda: 'ok') == 'ok'
+
+
+def test_slots_refill_after_cancelled_work(small_pool):
+    release = threading.Event()
+    for _ in range(2):
+        with pytest.raises(PasswordServiceBusy):
+            _run_in_pool(release.wait, 5)
+    release.set()
+    for _ in range(4):
+        assert _run_in_pool(lambda: 'ok') == 'ok'
+
+
+def test_hash_round_trip():
+    password_hash = passwords.hash_password('secret')
+    assert passwords.verify_password(password_hash, 'secret')
+    assert not passwords.verify_password(password_hash, 'wrong')
@@ -0,0 +1,45 @@
+from datetime import date
+
+from app import db
+from models import Expense
+from report_engine import expense_rows, group_filter, UNASSIGNED
+
+DAY = date(2032, 3, 1)
+
+
+def add_expenses(day=DAY):
+    db.session.add_all([
+        Expense(expense_date=day, category='Utilities', description='Unassigned',
+                amount_usd=10, currency_type='USD'),
+        Expense(expense_date=day, facility_id=1, event_id=1, category='Cleaning',
+                description='Facility 1', amount_usd=5, currency_type='USD'),
+    ])
+    db.session.commit()
+
+
+def test_group_filter_values():
+    assert group_filter('3') == 3
+    assert group_filter(UNASSIGNED) == UNASSIGNED
+    assert group_filter(None) is None
+    assert group_filter('x') is None
+
+
+def test_unassigned_drill_down_lists_only_unassigned_rows(app_context):
+    add_expenses()
+    unassigned = expense_rows(DAY, DAY, facility_id=UNASSIGNED, event_id=UNASSIGNED,
+                              customer_id=UNASSIGNED).all()
+    assert [row.description for row in unassigned] == ['Unassigned']
+    assert len(expense_rows(DAY, DAY).all()) == 2
+
+
+def test_unassigned_group_link(app, client):
+    day = date(2032, 4, 1)
+    with app.app_context():
+        add_expenses(day)
+    response = client.get(f'/reports/income-expense?start_date={day}&end_date={day}')
+    assert b'facility_id=none' in response.data
+
+    response = client.get(f'/reports/income-expense?start_date={day}&end_date={day}'
+                          '&detail=expenses&facility_id=none&event_id=none&customer_id=none')
+    assert b'Unassigned' in response.data
+    assert b'Facility 1' not in response.data
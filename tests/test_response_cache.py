@@ -0,0 +1,32 @@
+from sqlalchemy import event
+
+from app import db
+from models import Facility, TableVersion
+
+
+def test_empty_commit_checks_out_no_connection(app_context):
+    checkouts = []
+
+    def checkout(*args):
+        checkouts.append(1)
+    engine = db.engine
+    event.listen(engine, 'checkout', checkout)
+    try:
+        db.session.commit()
+    finally:
+        event.remove(engine, 'checkout', checkout)
+    assert checkouts == []
+
+
+def test_commit_bumps_versions_of_written_tables(app_context):
+    def version():
+        row = db.session.get(TableVersion, 'facilities')
+        return row.version if row else 0
+
+    before = version()
+    db.session.commit()
+    Facility.query.first().description = 'bumped'
+    db.session.commit()
+    assert version() == before + 1
+    db.session.commit()
+    assert version() == before + 1
@@ -0,0 +1,36 @@
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from conftest import ROOT
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize('script', ['run.py', 'app.py'])
+def test_documented_start_command_serves_the_login_page(fresh_env, script):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, script], cwd=ROOT, env=dict(fresh_env, PORT=str(port)),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            assert server.poll() is None, server.stdout.read()
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=2) as response:
+                    assert response.status == 200
+                    break
+            except OSError:
+                assert time.monotonic() < deadline, 'server did not start'
+                time.sleep(0.2)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
@@ -0,0 +1,34 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def increment(connection, table, keys, increments):
+    """Add ``increments`` to the row of ``table`` identified by ``keys``.
+
+    The row is created when it doesn't exist yet. Runs as a single
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent writers never lose an
+    update or trip over the unique key.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        insert = postgresql.insert
+    elif dialect == 'sqlite':
+        insert = sqlite.insert
+    else:
+        return _increment_portable(connection, table, keys, increments)
+
+    stmt = insert(table).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: table.c[name] + stmt.excluded[name] for name in increments}
+    )
+    connection.execute(stmt)
+
+
+def _increment_portable(connection, table, keys, increments):
+    where = [table.c[name] == value for name, value in keys.items()]
+    result = connection.execute(
+        table.update().where(*where).values(
+            **{name: table.c[name] + value for name, value in increments.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**keys, **increments))
@@ -0,0 +1,128 @@
+from app import db
+from models import Booking, Facility
+from availability import is_active
+from datetime import date, timedelta
+from decimal import Decimal
+import calendar
+
+# Longest window one utilization report may cover (about ten years)
+MAX_WINDOW_DAYS = 3660
+
+WEEKDAYS = list(calendar.day_abbr)
+MONTHS = list(calendar.month_abbr)[1:]
+
+
+def occupancy_matrix(facility_ids, start_date, end_date):
+    """Booked days of each facility over ``start_date``..``end_date``.
+
+    Returns ``(matrix, fees)``: ``matrix`` is a bytearray with one row per
+    facility and one byte per day (1 for booked), ``fees`` the booked USD
+    fees per facility. Filled from a single range query; every metric is
+    then counted over slices of the matrix instead of day by day.
+    """
+    days = (end_date - start_date).days + 1
+    row_of = {facility_id: i for i, facility_id in enumerate(facility_ids)}
+    matrix = bytearray(days * len(facility_ids))
+    fees = [Decimal(0)] * len(facility_ids)
+    if not facility_ids:
+        return matrix, fees
+
+    rows = db.session.query(Booking.facility_id, Booking.booking_date, Booking.total_fee_usd).filter(
+        Booking.facility_id.in_(facility_ids),
+        Booking.booking_date.between(start_date, end_date),
+        is_active()
+    ).all()
+
+    origin = start_date.toordinal()
+    for facility_id, booking_date, fee in rows:
+        row = row_of[facility_id]
+        matrix[row * days + booking_date.toordinal() - origin] = 1
+        fees[row] += fee or 0
+    return matrix, fees
+
+
+def _month_spans(start_date, end_date):
+    """``(month_index, first, stop)`` day offsets of each calendar month in the window."""
+    spans = []
+    day = start_date
+    while day <= end_date:
+        last = date(day.year, day.month, calendar.monthrange(day.year, day.month)[1])
+        stop = min(last, end_date)
+        spans.append((day.month - 1, (day - start_date).days, (stop - start_date).days + 1))
+        day = stop + timedelta(days=1)
+    return spans
+
+
+def _rate(booked, available):
+    return round(booked / available, 4) if available else 0.0
+
+
+def _breakdown(labels, booked, available):
+    return [{'label': label, 'booked_days': b, 'available_days': a, 'occupancy': _rate(b, a)}
+            for label, b, a in zip(labels, booked, available)]
+
+
+def facility_utilization(start_date, end_date, facility_ids=None):
+    """Occupancy, revenue per available day and weekday/month heatmaps.
+
+    One entry per facility (all of them by default), followed by the
+    totals over every facility. Cancelled bookings do not count; revenue
+    is the booked fee of the days in the window.
+    """
+    query = Facility.query.order_by(Facility.name)
+    if facility_ids:
+        query = query.filter(Facility.id.in_(facility_ids))
+    facilities = query.all()
+
+    days = (end_date - start_date).days + 1
+    matrix, fees = occupancy_matrix([f.id for f in facilities], start_date, end_date)
+    months = _month_spans(start_date, end_date)
+    # Offset of the first day of each weekday, Monday first
+    weekday_starts = [(weekday - start_date.weekday()) % 7 for weekday in range(7)]
+
+    weekday_days = [len(range(first, days, 7)) for first in weekday_starts]
+    month_days = [0] * 12
+    for month, first, stop in months:
+        month_days[month] += stop - first
+
+    results = []
+    totals_weekday, totals_month = [0] * 7, [0] * 12
+    for i, facility in enumerate(facilities):
+        start, end = i * days, (i + 1) * days
+        booked = matrix.count(1, start, end)
+        weekday = [matrix[start + first:end:7].count(1) for first in weekday_starts]
+        month = [0] * 12
+        for index, first, stop in months:
+            month[index] += matrix.count(1, start + first, start + stop)
+        totals_weekday = [a + b for a, b in zip(totals_weekday, weekday)]
+        totals_month = [a + b for a, b in zip(totals_month, month)]
+
+        results.append({
+            'facility_id': facility.id,
+            'facility': facility.name,
+            'list_fee_usd': float(facility.usd_fee or 0),
+            'available_days': days,
+            'booked_days': booked,
+            'occupancy': _rate(booked, days),
+            'revenue_usd': float(fees[i]),
+            'revenue_per_available_day': round(float(fees[i]) / days, 2),
+            'average_fee_per_booked_day': round(float(fees[i]) / booked, 2) if booked else 0.0,
+            'weekday': _breakdown(WEEKDAYS, weekday, weekday_days),
+            'month': _breakdown(MONTHS, month, month_days),
+        })
+
+    count = len(facilities)
+    booked = matrix.count(1)
+    revenue = float(sum(fees))
+    totals = {
+        'facilities': count,
+        'available_days': days * count,
+        'booked_days': booked,
+        'occupancy': _rate(booked, days * count),
+        'revenue_usd': revenue,
+        'revenue_per_available_day': round(revenue / (days * count), 2) if count else 0.0,
+        'weekday': _breakdown(WEEKDAYS, totals_weekday, [d * count for d in weekday_days]),
+        'month': _breakdown(MONTHS, totals_month, [d * count for d in month_days]),
+    }
+    return {'start': start_date.isoformat(), 'end': end_date.isoformat(),
+            'facilities': results, 'totals': totals}